@@ -0,0 +1,55 @@
+import os
+import tempfile
+from typing import IO
+
+
+# Writes a file so that readers only ever see the old contents or the whole of the new ones. The
+# contents go to a temporary file in the same directory, which commit() renames over path. Each
+# writer gets its own temporary file, so processes writing the same path at once don't clobber
+# each other's half written files: the last one to commit wins.
+# Ex:
+# with AtomicWriter("out/cache.pkl", "wb") as f:
+#     pickle.dump(entries, f)
+class AtomicWriter(object):
+
+    def __init__(self, path: str, mode: str = "w"):
+        self._path = path
+        fd, self._temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                               prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            self.file = os.fdopen(fd, mode)  # type: IO
+        except BaseException:
+            os.close(fd)
+            os.remove(self._temp_path)
+            raise
+
+    # Closes the temporary file and renames it over path.
+    def commit(self):
+        try:
+            self.file.close()
+            # mkstemp creates the file readable by its owner only, so give it the permissions
+            # open() would have
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(self._temp_path, 0o666 & ~umask)
+            os.replace(self._temp_path, self._path)
+        except BaseException:
+            self.abort()
+            raise
+
+    # Closes and removes the temporary file, leaving path as it was.
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    # Returns the temporary file, which is committed if the block finishes and aborted if it
+    # raises.
+    def __enter__(self) -> IO:
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
@@ -0,0 +1,120 @@
+import argparse
+import concurrent.futures
+import functools
+import glob
+import math
+import os
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from corpus import CorpusReader, is_corpus, load_puzzle
+from puzzle import COL_CLUES_SUFFIX, ROW_CLUES_SUFFIX, Puzzle
+from search import SearchSolver
+from solver import SolveResult, Solver
+
+STATUS_ERROR = "error"  # the puzzle couldn't be loaded or solving it failed
+
+
+# The outcome of solving one puzzle in a batch. status is one of the solver.STATUS_ constants, or
+# STATUS_ERROR. grid is the puzzle as printed by Puzzle.__str__(), or an error message if status
+# is STATUS_ERROR.
+class BatchResult(object):
+
+    def __init__(self, name: str, status: str, seconds: float, line_solves: int, grid: str):
+        self.name = name
+        self.status = status
+        self.seconds = seconds
+        self.line_solves = line_solves
+        self.grid = grid
+
+    @classmethod
+    def from_solve_result(cls, name: str, result: SolveResult, grid: str) -> "BatchResult":
+        return cls(name, result.status, result.seconds, result.line_solves, grid)
+
+
+# Returns (name, row clues path, col clues path) for every pair of clue files in a directory,
+# eg. lib/5by5RowClues.txt and lib/5by5ColClues.txt give name 5by5. Largest puzzles come first.
+def find_puzzles(directory: str) -> List[Tuple[str, str, str]]:
+    puzzles = []
+    for row_path in glob.glob(os.path.join(directory, "*" + ROW_CLUES_SUFFIX)):
+        name = os.path.basename(row_path)[:-len(ROW_CLUES_SUFFIX)]
+        col_path = Puzzle.clue_paths(directory, name)[1]
+        if os.path.exists(col_path):
+            puzzles.append((name, row_path, col_path))
+    puzzles.sort(key=lambda puzzle: (-_num_lines(puzzle[1]) * _num_lines(puzzle[2]), puzzle[0]))
+    return puzzles
+
+
+def _num_lines(path: str) -> int:
+    with open(path, "r") as f:
+        return sum(1 for line in f)
+
+
+# Solves one puzzle in a worker process. make_puzzle loads the puzzle, and must be picklable.
+# Never raises, so one bad puzzle can't stop a batch.
+def _solve_puzzle(name: str, make_puzzle: Callable[[], Puzzle], timeout: Optional[float], search: bool) -> BatchResult:
+    start_time = time.perf_counter()
+    solver = None
+    try:
+        puzzle = make_puzzle()
+        solver = SearchSolver(puzzle) if search else Solver(puzzle)
+        return BatchResult.from_solve_result(name, solver.anytime_solve(timeout), puzzle.__str__())
+    except Exception as e:
+        line_solves = 0 if solver is None else solver.get_num_line_solves()
+        return BatchResult(name, STATUS_ERROR, time.perf_counter() - start_time, line_solves, repr(e))
+
+
+# Solves every puzzle in a directory across a pool of worker processes, largest first, and
+# yields the results in the order they finish.
+# timeout: seconds each puzzle may take before it's abandoned. None for no limit.
+# search: use SearchSolver so puzzles line solving can't finish are solved too.
+def solve_directory(directory: str, workers: Optional[int] = None, timeout: Optional[float] = None,
+                    search: bool = True) -> Iterator[BatchResult]:
+    puzzles = [(name, functools.partial(Puzzle, name, row_path, col_path))
+               for name, row_path, col_path in find_puzzles(directory)]
+    return _solve_all(puzzles, workers, timeout, search)
+
+
+# Same as solve_directory(), for every puzzle in a corpus file (see corpus.py). Each worker
+# memory maps the corpus once and reads only the puzzles it's given.
+def solve_corpus(path: str, workers: Optional[int] = None, timeout: Optional[float] = None,
+                 search: bool = True) -> Iterator[BatchResult]:
+    with CorpusReader(path) as corpus:
+        names = sorted(corpus.get_names(), key=lambda name: -math.prod(corpus.get_size(name)))
+    puzzles = [(name, functools.partial(load_puzzle, path, name)) for name in names]
+    return _solve_all(puzzles, workers, timeout, search)
+
+
+def _solve_all(puzzles: List[Tuple[str, Callable[[], Puzzle]]], workers: Optional[int], timeout: Optional[float],
+               search: bool) -> Iterator[BatchResult]:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_solve_puzzle, name, make_puzzle, timeout, search) for name, make_puzzle in puzzles]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+# Writes a batch result to an open output file, in the same layout Solver writes out/<name>.txt.
+def write_result(out_file, result: BatchResult):
+    out_file.write("%s: %s, line solves = %d\n" % (result.name, result.status, result.line_solves))
+    out_file.write(result.grid)
+    out_file.write("Time = %.4f seconds\n\n" % result.seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve every pair of clue files in a directory, or every puzzle "
+                                                 "in a corpus file.")
+    parser.add_argument("directory", nargs="?", default="lib", help="directory of clue files, or a corpus file")
+    parser.add_argument("--out", default=os.path.join("out", "batch.txt"), help="file all results are written to")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed per puzzle")
+    parser.add_argument("--no-search", action="store_true", help="only use line solving")
+    args = parser.parse_args()
+    with open(args.out, "w") as out_file:
+        solve = solve_corpus if is_corpus(args.directory) else solve_directory
+        for result in solve(args.directory, args.workers, args.timeout, not args.no_search):
+            write_result(out_file, result)
+            print("%s: %s in %.4f seconds" % (result.name, result.status, result.seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from batch import find_puzzles
+from generate import clues_for_grid, random_grid
+from line_cache import LineCache
+from numpy_engine import NumpySolver, is_available as is_numpy_available
+from parallel import ParallelSolver
+from propagator import score_slack
+from puzzle import Puzzle
+from search import SearchSolver
+from solver import RoundSolver, SolveTimeout, Solver
+
+DEFAULT_SYNTHETIC_SIZES = [75, 100]
+DEFAULT_DENSITY = 0.6
+DEFAULT_THRESHOLD = 0.2  # fraction a median time may grow by before it counts as a regression
+
+
+# A strategy creates a solver for a puzzle and returns a function that solves it with a timeout.
+AnySolver = Union[Solver, RoundSolver]
+Strategy = Callable[[Puzzle], Tuple[AnySolver, Callable[[Optional[float]], bool]]]
+
+
+def _strategies() -> Dict[str, Strategy]:
+    def with_solve(solver: AnySolver, **kwargs) -> Tuple[AnySolver, Callable[[Optional[float]], bool]]:
+        return solver, lambda timeout: solver.solve(timeout, **kwargs)
+
+    def with_sweep(solver: Solver) -> Tuple[Solver, Callable[[Optional[float]], bool]]:
+        return solver, solver.sweep_solve
+
+    strategies = {
+        "slow_solve": lambda puzzle: with_sweep(Solver(puzzle)),
+        "priority": lambda puzzle: with_solve(Solver(puzzle)),
+        "priority_update": lambda puzzle: with_solve(Solver(puzzle), update_solve=True),
+        "priority_queue": lambda puzzle: with_solve(Solver(puzzle), queue_solve=True),
+        "priority_update_queue": lambda puzzle: with_solve(Solver(puzzle), update_solve=True, queue_solve=True),
+        "priority_cached": lambda puzzle: with_solve(Solver(puzzle, cache=LineCache())),
+        "priority_no_skip": lambda puzzle: with_solve(Solver(puzzle, incremental=False)),
+        "priority_slack": lambda puzzle: with_solve(Solver(puzzle, score=score_slack)),
+        "search": lambda puzzle: with_solve(SearchSolver(puzzle)),
+        "parallel": lambda puzzle: with_solve(ParallelSolver(puzzle)),
+    }
+    if is_numpy_available():
+        strategies["numpy"] = lambda puzzle: with_solve(NumpySolver(puzzle))
+    return strategies
+
+
+STRATEGIES = _strategies()
+
+
+# Returns the clues of a random grid, filled with the given probability per square. The same
+# seed always gives the same puzzle.
+def random_clues(rows: int, cols: int, density: float, seed: int) -> Tuple[List[List[int]], List[List[int]]]:
+    return clues_for_grid(random_grid(rows, cols, density, seed), cols)
+
+
+# Returns (name, function creating a fresh Puzzle) for every puzzle to benchmark.
+def collect_puzzles(lib: str, sizes: List[int], density: float, seed: int) -> List[Tuple[str, Callable[[], Puzzle]]]:
+    puzzles = []
+    for name, row_path, col_path in find_puzzles(lib):
+        puzzles.append((name, lambda name=name, row_path=row_path, col_path=col_path: Puzzle(name, row_path, col_path)))
+    for size in sizes:
+        name = "random%dby%d" % (size, size)
+        row_clues, col_clues = random_clues(size, size, density, seed + size)
+        puzzles.append((name, lambda name=name, row_clues=row_clues, col_clues=col_clues:
+                        Puzzle.from_clues(name, row_clues, col_clues)))
+    return puzzles
+
+
+# Runs one strategy on one puzzle: warmup runs, then timed repeats, then one extra run under
+# tracemalloc for peak memory (kept separate since tracing slows everything down).
+def run_case(name: str, make_puzzle: Callable[[], Puzzle], strategy_name: str, repeats: int, warmup: int,
+             timeout: Optional[float]) -> dict:
+    strategy = STRATEGIES[strategy_name]
+    times_ns = []
+    status = None
+    line_solves = 0
+    skipped_solves = 0
+    cells_deduced = 0
+    for i in range(warmup + repeats):
+        puzzle = make_puzzle()
+        solver, solve = strategy(puzzle)
+        known_before = puzzle.get_num_known_squares()
+        start_ns = time.perf_counter_ns()
+        try:
+            status = "solved" if solve(timeout) else "unsolved"
+        except SolveTimeout:
+            status = "timeout"
+        end_ns = time.perf_counter_ns()
+        if i >= warmup:
+            times_ns.append(end_ns - start_ns)
+        line_solves = solver.get_num_line_solves()
+        skipped_solves = solver.get_num_skipped_solves()
+        cells_deduced = puzzle.get_num_known_squares() - known_before
+        if status == "timeout":
+            break  # don't spend repeats * timeout on a case that can't finish
+    puzzle = make_puzzle()
+    solver, solve = strategy(puzzle)
+    tracemalloc.start()
+    try:
+        solve(timeout)
+    except SolveTimeout:
+        pass
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"puzzle": name,
+            "strategy": strategy_name,
+            "rows": puzzle.rows,
+            "cols": puzzle.cols,
+            "status": status,
+            "line_solves": line_solves,
+            "skipped_solves": skipped_solves,
+            "cells_deduced": cells_deduced,
+            "times_ns": times_ns,
+            "median_ns": int(statistics.median(times_ns)) if times_ns else None,
+            "min_ns": min(times_ns) if times_ns else None,
+            "peak_bytes": peak_bytes}
+
+
+def run_benchmark(puzzles: List[Tuple[str, Callable[[], Puzzle]]], strategy_names: List[str], repeats: int = 3,
+                  warmup: int = 1, timeout: Optional[float] = 60, log: Callable[[str], None] = print) -> dict:
+    results = []
+    for name, make_puzzle in puzzles:
+        for strategy_name in strategy_names:
+            result = run_case(name, make_puzzle, strategy_name, repeats, warmup, timeout)
+            log("%-16s %-22s %-9s median %10.3f ms, %6d line solves, peak %8d KiB"
+                % (name, strategy_name, result["status"], (result["median_ns"] or 0) / 1e6,
+                   result["line_solves"], result["peak_bytes"] // 1024))
+            results.append(result)
+    return {"meta": {"date": datetime.datetime.now().isoformat(),
+                     "python": sys.version,
+                     "platform": platform.platform(),
+                     "cpus": os.cpu_count(),
+                     "repeats": repeats,
+                     "warmup": warmup,
+                     "timeout": timeout},
+            "results": results}
+
+
+# Returns a description of every case that got worse compared to a baseline run: slower by more
+# than threshold, more line solves, or no longer solved.
+def find_regressions(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    old_results = {(result["puzzle"], result["strategy"]): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = (result["puzzle"], result["strategy"])
+        old = old_results.get(key)
+        if old is None:
+            continue
+        label = "%s/%s" % key
+        if old["status"] == "solved" and result["status"] != "solved":
+            regressions.append("%s: %s, was solved" % (label, result["status"]))
+        if old["median_ns"] and result["median_ns"] and result["median_ns"] > old["median_ns"] * (1 + threshold):
+            regressions.append("%s: median %.3f ms, was %.3f ms"
+                               % (label, result["median_ns"] / 1e6, old["median_ns"] / 1e6))
+        if result["line_solves"] > old["line_solves"]:
+            regressions.append("%s: %d line solves, was %d" % (label, result["line_solves"], old["line_solves"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every solving strategy on every puzzle.")
+    parser.add_argument("--lib", default="lib", help="directory holding the clue files")
+    parser.add_argument("--sizes", type=int, nargs="*", default=DEFAULT_SYNTHETIC_SIZES,
+                        help="sizes of the random square puzzles to add")
+    parser.add_argument("--density", type=float, default=DEFAULT_DENSITY)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per run")
+    parser.add_argument("--out", default=os.path.join("out", "benchmark.json"))
+    parser.add_argument("--baseline", help="earlier --out file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+    puzzles = collect_puzzles(args.lib, args.sizes, args.density, args.seed)
+    report = run_benchmark(puzzles, args.strategies, args.repeats, args.warmup, args.timeout)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = find_regressions(json.load(f), report, args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
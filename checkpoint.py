@@ -0,0 +1,102 @@
+import argparse
+import os
+import pickle
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from atomic_file import AtomicWriter
+
+# A checkpoint holds everything needed to carry on a solve in another process: the clues, the
+# grid, the queue of lines waiting to be solved, the search trail and the counters. See
+# Solver.get_checkpoint() and Solver.resume().
+#
+# File layout: CHECKPOINT_MAGIC, then a pickled dict of the Checkpoint's attributes. Only ints,
+# bools, strs, tuples, lists and dicts are pickled, so a checkpoint doesn't depend on the
+# classes of the process that wrote it. The grid and the trail's grids are Puzzle.snapshot()
+# tuples of row and col bitmasks, so writing and resuming take time proportional to their size.
+CHECKPOINT_MAGIC = b"NGCKPT1\n"
+CHECKPOINT_SUFFIX = ".ckpt"
+DEFAULT_INTERVAL = 30.0  # seconds between checkpoints written by a Solver
+
+Clues = List[List[int]]
+
+
+# The state of a solve between two line solves.
+# engine, update_solve, queue_solve: how the Solver was set up
+# grid: Puzzle.snapshot() of the grid
+# queue: Propagator.get_state()
+# deferred: (line_num, is_row, round) of each line the Solver put off solving
+# stats: the Solver's counters by name
+# search: for SearchSolver, its settings and trail by name, else None
+class Checkpoint(object):
+
+    def __init__(self, row_clues: Clues, col_clues: Clues, engine: str, update_solve: bool, queue_solve: bool,
+                 grid: tuple, queue: Tuple[List[Tuple[int, bool, int, int]], int, int],
+                 deferred: List[Tuple[int, bool, int]], stats: Dict[str, int], search: Optional[Dict[str, Any]]):
+        self.row_clues = row_clues
+        self.col_clues = col_clues
+        self.engine = engine
+        self.update_solve = update_solve
+        self.queue_solve = queue_solve
+        self.grid = grid
+        self.queue = queue
+        self.deferred = deferred
+        self.stats = stats
+        self.search = search
+
+
+# Writes a checkpoint to path, which keeps the previous checkpoint if the process dies while
+# writing (see AtomicWriter).
+def write_checkpoint(path: str, checkpoint: Checkpoint):
+    with AtomicWriter(path, "wb") as f:
+        f.write(CHECKPOINT_MAGIC)
+        pickle.dump(vars(checkpoint), f, pickle.HIGHEST_PROTOCOL)
+
+
+# Reads a checkpoint written by write_checkpoint(). Raises ValueError if path doesn't hold one.
+def read_checkpoint(path: str) -> Checkpoint:
+    with open(path, "rb") as f:
+        if f.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+            raise ValueError(path + " is not a checkpoint")
+        return Checkpoint(**pickle.load(f))
+
+
+def main():
+    # imported here since solver.py imports this module
+    from puzzle import Puzzle
+    from search import SearchSolver
+    from solver import Solver
+
+    parser = argparse.ArgumentParser(description="Solve a puzzle, writing checkpoints as it goes. If the "
+                                                 "checkpoint file exists, carry on from it instead.")
+    parser.add_argument("name", help="puzzle name, eg. 50by50 for lib/50by50RowClues.txt")
+    parser.add_argument("--lib", default="lib", help="directory holding the clue files")
+    parser.add_argument("--checkpoint", help="checkpoint file, defaults to out/<name>" + CHECKPOINT_SUFFIX)
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds between checkpoints")
+    parser.add_argument("--search", action="store_true", help="search when line solving stalls")
+    args = parser.parse_args()
+    path = args.checkpoint or os.path.join("out", args.name + CHECKPOINT_SUFFIX)
+    start_time = time.perf_counter()
+    is_resume = os.path.exists(path)
+    if is_resume:
+        checkpoint = read_checkpoint(path)
+        puzzle = Puzzle.from_clues(args.name, checkpoint.row_clues, checkpoint.col_clues)
+        solver = SearchSolver(puzzle) if checkpoint.search is not None else Solver(puzzle, checkpoint.engine)
+        solver.set_checkpoint(checkpoint)
+        print("Resuming from %s with %d squares known" % (path, puzzle.get_num_known_squares()))
+    else:
+        puzzle = Puzzle.from_directory(args.name, args.lib)
+        solver = SearchSolver(puzzle) if args.search else Solver(puzzle)
+    solver.set_checkpoint_file(path, args.interval)
+    is_solved = solver.resume() if is_resume else solver.solve()
+    solver.set_checkpoint_file(None)
+    print("%s in %.4f seconds, %d line solves" % ("Solved" if is_solved else "Not solved",
+                                                   time.perf_counter() - start_time, solver.get_num_line_solves()))
+    print(puzzle)
+    # the solve is finished, so there's nothing left to resume
+    if os.path.exists(path):
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
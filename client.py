@@ -1,29 +1,17 @@
-from puzzle import Puzzle
-from solver import Solver
+from batch import main as batch_main
 
 
 def main():
-    # test_names = ["5by5",
-    #               "10by10",
-    #               "15by15",
-    #               "20by20",
-    #               "25by25",
-    #               "30by25",
-    #               "50by50"
-    #               ]
-    # tests = [] * len(test_names)
-    # for i in range(len(tests)):
-    #     name = test_names[i]
-    #     tests[i] = Solver(Puzzle(name,
-    #                              "lib\\" + name + "RowClues.txt",
-    #                              "lib\\" + name + "ColClues.txt"
-    #                              ))
-    #     tests[i].priority_solve(update_solve=True)
-    p = Puzzle("5by5", "lib\\5by5RowClues.txt", "lib\\5by5ColClues.txt")
-    s = Solver(p)
-    # s.slow_solve()
-    s.priority_solve(queue_solve=True)
+    # To solve a single puzzle:
+    # with Puzzle.from_directory("5by5", "lib") as p:
+    #     s = Solver(p)
+    #     s.slow_solve()
+    #     s.priority_solve(queue_solve=True)
+    # Or have a running solve service (python service.py) solve it, cached for every tool:
+    # job = ServiceClient().solve(Puzzle.read_clues_file(row_clues_path), Puzzle.read_clues_file(col_clues_path))
+    # Solve every puzzle in lib/ (see batch.py for options)
+    batch_main()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,313 @@
+import argparse
+import collections
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, Tuple
+
+from atomic_file import AtomicWriter
+from puzzle import Puzzle
+
+# A corpus holds many puzzles in one file, followed by an index of where each one starts, so a
+# reader can jump straight to any puzzle. There are two variants with the same layout.
+#
+# Text, readable and editable by hand:
+#   # nonogram corpus 1
+#   puzzle <name> <rows> <cols>
+#   <one line of space separated clues per row, then per col>
+#   puzzle ...
+#   index
+#   <name> <offset of its puzzle line> <rows> <cols>
+#   ...
+#   end <offset of the index line>
+#
+# Binary, about half the size: BINARY_MAGIC, then each puzzle as varints (rows, cols, and
+# per line the number of clues followed by the clues), then the index as varints (name length,
+# name, offset, rows, cols), then the offset of the index as a little endian uint64.
+TEXT_MAGIC = b"# nonogram corpus 1\n"
+BINARY_MAGIC = b"NGCORPB1"
+_INDEX_OFFSET = struct.Struct("<Q")
+
+Clues = List[List[int]]
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+# Returns the varint at pos in data, and the position after it.
+def _read_varint(data, pos: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+# Writes puzzles to a new corpus file. The file only replaces path when closed (see
+# AtomicWriter), so an interrupted write never leaves a half written corpus behind.
+# Ex:
+# with CorpusWriter("out/lib.corpus") as writer:
+#     writer.add("5by5", row_clues, col_clues)
+class CorpusWriter(object):
+
+    def __init__(self, path: str, binary: bool = False):
+        self._binary = binary
+        self._index = []  # (name, offset, rows, cols)
+        self._names = set()
+        self._writer = AtomicWriter(path, "wb")
+        self._f = self._writer.file
+        self._f.write(BINARY_MAGIC if binary else TEXT_MAGIC)
+
+    def add(self, name: str, row_clues: Clues, col_clues: Clues):
+        if not name or any(ch.isspace() for ch in name):
+            raise ValueError("Puzzle names can't be empty or contain whitespace, got " + repr(name))
+        if name in self._names:
+            raise ValueError("Corpus already has a puzzle named " + name)
+        self._names.add(name)
+        self._index.append((name, self._f.tell(), len(row_clues), len(col_clues)))
+        if self._binary:
+            out = bytearray()
+            _write_varint(out, len(row_clues))
+            _write_varint(out, len(col_clues))
+            for line in row_clues + col_clues:
+                line = [clue for clue in line if clue > 0]
+                _write_varint(out, len(line))
+                for clue in line:
+                    _write_varint(out, clue)
+            self._f.write(out)
+        else:
+            text = "puzzle %s %d %d\n" % (name, len(row_clues), len(col_clues))
+            text += "".join(" ".join(str(clue) for clue in line if clue > 0) + "\n" for line in row_clues + col_clues)
+            self._f.write(text.encode())
+
+    # Writes the index and moves the file into place.
+    def close(self):
+        if self._f is None:
+            return
+        index_offset = self._f.tell()
+        if self._binary:
+            out = bytearray()
+            for name, offset, rows, cols in self._index:
+                encoded = name.encode()
+                _write_varint(out, len(encoded))
+                out += encoded
+                _write_varint(out, offset)
+                _write_varint(out, rows)
+                _write_varint(out, cols)
+            out += _INDEX_OFFSET.pack(index_offset)
+            self._f.write(out)
+        else:
+            text = "index\n" + "".join("%s %d %d %d\n" % entry for entry in self._index)
+            self._f.write((text + "end %d\n" % index_offset).encode())
+        self._f = None
+        self._writer.commit()
+
+    # Drops everything written so far.
+    def abort(self):
+        if self._f is None:
+            return
+        self._f = None
+        self._writer.abort()
+
+    def __enter__(self) -> "CorpusWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# Reads a corpus file of either variant through a memory map. Only the index is parsed when the
+# corpus is opened; a puzzle's clues are parsed when it is asked for, so iterating over a large
+# corpus never holds more than one puzzle's clues at a time.
+# Ex:
+# with CorpusReader("out/lib.corpus") as corpus:
+#     for name, row_clues, col_clues in corpus:
+#         ...
+class CorpusReader(object):
+
+    def __init__(self, path: str):
+        self._path = path
+        self._f = open(path, "rb")
+        try:
+            self._data = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._f.close()
+            raise ValueError("Not a corpus file: " + path)
+        if self._data[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+            self._binary = True
+        elif self._data[:len(TEXT_MAGIC)] == TEXT_MAGIC:
+            self._binary = False
+        else:
+            self.close()
+            raise ValueError("Not a corpus file: " + path)
+        # name -> (offset, rows, cols), in the order the puzzles were added
+        self._index = collections.OrderedDict()
+        try:
+            if self._binary:
+                self._read_binary_index()
+            else:
+                self._read_text_index()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_binary_index(self):
+        end = len(self._data) - _INDEX_OFFSET.size
+        pos = _INDEX_OFFSET.unpack_from(self._data, end)[0]
+        while pos < end:
+            name_length, pos = _read_varint(self._data, pos)
+            name = self._data[pos:pos + name_length].decode()
+            pos += name_length
+            offset, pos = _read_varint(self._data, pos)
+            rows, pos = _read_varint(self._data, pos)
+            cols, pos = _read_varint(self._data, pos)
+            self._index[name] = (offset, rows, cols)
+
+    def _read_text_index(self):
+        last_line_start = self._data.rfind(b"\n", 0, len(self._data) - 1) + 1
+        trailer = self._data[last_line_start:].split()
+        if len(trailer) != 2 or trailer[0] != b"end":
+            raise ValueError("Corpus file has no index: " + self._path)
+        lines = self._data[int(trailer[1]):last_line_start].decode().splitlines()
+        for line in lines[1:]:
+            name, offset, rows, cols = line.split()
+            self._index[name] = (int(offset), int(rows), int(cols))
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+            self._f.close()
+
+    def __enter__(self) -> "CorpusReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    # Returns the names of the puzzles, in the order they were added.
+    def get_names(self) -> List[str]:
+        return list(self._index)
+
+    # Returns (rows, cols) of a puzzle without parsing its clues.
+    def get_size(self, name: str) -> Tuple[int, int]:
+        offset, rows, cols = self._index[name]
+        return rows, cols
+
+    # Returns (row clues, col clues) of a puzzle. Raises KeyError if there is no such puzzle.
+    def get_clues(self, name: str) -> Tuple[Clues, Clues]:
+        offset, rows, cols = self._index[name]
+        if self._binary:
+            lines = self._parse_binary(offset)
+        else:
+            lines = self._parse_text(offset, rows + cols)
+        return lines[:rows], lines[rows:]
+
+    def _parse_binary(self, pos: int) -> Clues:
+        rows, pos = _read_varint(self._data, pos)
+        cols, pos = _read_varint(self._data, pos)
+        lines = []
+        for i in range(rows + cols):
+            count, pos = _read_varint(self._data, pos)
+            line = []
+            for j in range(count):
+                clue, pos = _read_varint(self._data, pos)
+                line.append(clue)
+            lines.append(line)
+        return lines
+
+    def _parse_text(self, pos: int, num_lines: int) -> Clues:
+        pos = self._data.find(b"\n", pos) + 1  # skip the puzzle line
+        lines = []
+        for i in range(num_lines):
+            end = self._data.find(b"\n", pos)
+            lines.append([int(clue) for clue in self._data[pos:end].split()])
+            pos = end + 1
+        return lines
+
+    def get_puzzle(self, name: str) -> Puzzle:
+        row_clues, col_clues = self.get_clues(name)
+        return Puzzle.from_clues(name, row_clues, col_clues)
+
+    # Yields (name, row clues, col clues) for every puzzle, in the order they were added.
+    def __iter__(self) -> Iterator[Tuple[str, Clues, Clues]]:
+        for name in self._index:
+            row_clues, col_clues = self.get_clues(name)
+            yield name, row_clues, col_clues
+
+
+# Writes every pair of clue files in a directory (see batch.find_puzzles()) to one corpus file.
+# Returns the number of puzzles written.
+def import_directory(directory: str, path: str, binary: bool = False) -> int:
+    # imported here since batch.py imports this module
+    from batch import find_puzzles
+
+    puzzles = find_puzzles(directory)
+    with CorpusWriter(path, binary) as writer:
+        for name, row_path, col_path in puzzles:
+            writer.add(name, Puzzle.read_clues_file(row_path), Puzzle.read_clues_file(col_path))
+    return len(puzzles)
+
+
+# Readers opened by load_puzzle(), kept open for the life of the process
+_readers = {}  # type: Dict[str, CorpusReader]
+
+
+# Returns a puzzle from a corpus file. The file is only opened and indexed the first time, so
+# this is cheap to call once per puzzle, eg. from worker processes.
+def load_puzzle(path: str, name: str) -> Puzzle:
+    reader = _readers.get(path)
+    if reader is None:
+        reader = CorpusReader(path)
+        _readers[path] = reader
+    return reader.get_puzzle(name)
+
+
+# True if the file at path starts like a corpus of either variant.
+def is_corpus(path: str) -> bool:
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        start = f.read(max(len(TEXT_MAGIC), len(BINARY_MAGIC)))
+    return start.startswith(BINARY_MAGIC) or start.startswith(TEXT_MAGIC)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect corpus files holding many puzzles.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="import every pair of clue files in a directory")
+    import_parser.add_argument("directory", nargs="?", default="lib")
+    import_parser.add_argument("path", nargs="?", default=os.path.join("out", "lib.corpus"))
+    import_parser.add_argument("--binary", action="store_true", help="write the compact binary variant")
+    list_parser = commands.add_parser("list", help="list the puzzles in a corpus")
+    list_parser.add_argument("path")
+    args = parser.parse_args()
+    if args.command == "import":
+        count = import_directory(args.directory, args.path, args.binary)
+        print("Wrote %d puzzles to %s" % (count, args.path))
+    else:
+        with CorpusReader(args.path) as corpus:
+            for name in corpus.get_names():
+                rows, cols = corpus.get_size(name)
+                print("%s %dx%d" % (name, rows, cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import math
+import random
+import sys
+from typing import List, Optional, Tuple
+
+from batch import find_puzzles
+from line_solver import solve_line
+from numpy_engine import NP_FILLED, NP_UNKNOWN, NumpySolver, is_available as is_numpy_available, pad_clues, \
+    solve_lines
+from puzzle import Puzzle
+from solver import ENGINE_COMBIN, ENGINE_DP, Solver
+
+# Checks the line solving engines against each other, since they must settle the same squares:
+# - the DP line solver against exhaustive enumeration, on random partly known lines
+# - the DP and combin engines of Solver, line by line, on partly known grids of the puzzles in
+#   lib/, some with a few squares set wrong so contradictions are checked too
+# - the NumPy engine against both, and NumpySolver against Solver on the lib/ puzzles, if NumPy
+#   is installed
+# Prints each line the engines disagree on, and exits with status 1 if there was one.
+DEFAULT_NUM_LINES = 2000
+DEFAULT_MAX_LENGTH = 12
+DEFAULT_NUM_GRIDS = 10
+MAX_COMBINATIONS = 1000  # lines the combin engine would have to try more arrangements of are skipped
+
+# What a line solve settled, as (known, filled) masks of the whole line, or None on a contradiction
+LineResult = Optional[Tuple[int, int]]
+
+
+# Solves a line by trying every way of filling its unknown squares.
+def brute_force_line(clues: List[int], length: int, known: int, filled: int) -> LineResult:
+    clues = [clue for clue in clues if clue > 0]
+    unknown = [i for i in range(length) if not known >> i & 1]
+    full = (1 << length) - 1
+    always_filled = full
+    ever_filled = 0
+    for bits in range(1 << len(unknown)):
+        line = filled & known
+        for j in range(len(unknown)):
+            if bits >> j & 1:
+                line |= 1 << unknown[j]
+        if Puzzle.generate_clues_for_mask(line, length) == clues:
+            always_filled &= line
+            ever_filled |= line
+    if always_filled == full and ever_filled == 0:
+        return None  # no arrangement matched
+    return always_filled | (full & ~ever_filled), always_filled
+
+
+def dp_line(clues: List[int], length: int, known: int, filled: int) -> LineResult:
+    solution = solve_line(clues, length, known, filled & known)
+    if solution is None:
+        return None
+    return solution.get_known(), solution.get_filled() & solution.get_known()
+
+
+# Solves line line_num of the puzzle, from the given snapshot, with the given engine.
+def engine_line(solver: Solver, puzzle: Puzzle, snapshot: tuple, line_num: int, is_row: bool) -> LineResult:
+    puzzle.restore(snapshot)
+    if solver._update_line(line_num, is_row) is None:
+        return None
+    known, filled = puzzle.get_line_masks(line_num, is_row)
+    return known, filled & known
+
+
+# Solves every row, or every col, of the puzzle in one call to the NumPy engine.
+def numpy_lines(puzzle: Puzzle, is_row: bool) -> List[LineResult]:
+    grid = NumpySolver(puzzle).get_grid()
+    lines = grid if is_row else grid.T
+    clues, counts = pad_clues([puzzle.get_clues(i, is_row) for i in range(len(lines))])
+    solved, is_consistent = solve_lines(lines, clues, counts)
+    results = []
+    for i in range(len(lines)):
+        if not is_consistent[i]:
+            results.append(None)
+            continue
+        known = sum(1 << j for j in range(lines.shape[1]) if solved[i, j] != NP_UNKNOWN)
+        filled = sum(1 << j for j in range(lines.shape[1]) if solved[i, j] == NP_FILLED)
+        results.append((known, filled))
+    return results
+
+
+# Returns the number of arrangements the combin engine tries for the line.
+def num_combinations(puzzle: Puzzle, line_num: int, is_row: bool) -> int:
+    k = puzzle.sum_clues_in_line(line_num, is_row) - puzzle.num_filled_squares_in_line(line_num, is_row)
+    num_unknown = puzzle.get_num_unknown_squares_in_line(line_num, is_row)
+    return math.comb(num_unknown, k) if 0 <= k <= num_unknown else 0
+
+
+# Compares the line solving engines with enumeration on random partly known lines.
+# Returns a description of each line they disagree on.
+def check_lines(num_lines: int, max_length: int, seed: int) -> List[str]:
+    rnd = random.Random(seed)
+    mismatches = []
+    for n in range(num_lines):
+        length = rnd.randint(1, max_length)
+        density = rnd.random()
+        line = sum(1 << i for i in range(length) if rnd.random() < density)
+        clue_line = line
+        if rnd.random() < 0.2:  # clues of another line, so some lines have no solution
+            clue_line = sum(1 << i for i in range(length) if rnd.random() < density)
+        clues = Puzzle.generate_clues_for_mask(clue_line, length) or [0]
+        reveal = rnd.random()
+        known = sum(1 << i for i in range(length) if rnd.random() < reveal)
+        filled = line & known
+        expected = brute_force_line(clues, length, known, filled)
+        puzzle = Puzzle.from_clues("line", [clues], [[] for i in range(length)])
+        for i in range(length):
+            if known >> i & 1:
+                if filled >> i & 1:
+                    puzzle.set_filled(0, i)
+                else:
+                    puzzle.set_blank(0, i)
+        snapshot = puzzle.snapshot()
+        results = {"dp": dp_line(clues, length, known, filled),
+                   ENGINE_COMBIN: engine_line(Solver(puzzle, ENGINE_COMBIN), puzzle, snapshot, 0, True)}
+        if is_numpy_available():
+            puzzle.restore(snapshot)
+            results["numpy"] = numpy_lines(puzzle, True)[0]
+        for name, result in results.items():
+            if result != expected:
+                mismatches.append("line %d: clues %s, known %s, filled %s: %s gave %s, enumeration %s"
+                                  % (n, clues, bin(known), bin(filled), name, result, expected))
+    return mismatches
+
+
+# Compares the combin and NumPy engines with the DP engine on every line of random partly known
+# grids of the puzzle. The combin engine skips lines with more than MAX_COMBINATIONS
+# arrangements to try. Returns the number of lines compared and a description of each line the
+# engines disagree on.
+def check_puzzle(name: str, row_clues: List[List[int]], col_clues: List[List[int]], num_grids: int,
+                 seed: int) -> Tuple[int, List[str]]:
+    solved = Puzzle.from_clues(name, row_clues, col_clues)
+    if not Solver(solved).solve():
+        raise ValueError(name + " can't be solved by line solving")
+    solution = [solved.get_line_masks(r, True)[1] for r in range(solved.rows)]
+    mismatches = []
+    if is_numpy_available():
+        numpy_solved = Puzzle.from_clues(name, row_clues, col_clues)
+        NumpySolver(numpy_solved).solve()
+        if [numpy_solved.get_line_masks(r, True) for r in range(solved.rows)] \
+                != [solved.get_line_masks(r, True) for r in range(solved.rows)]:
+            mismatches.append("%s: NumpySolver.solve() ended with another grid than Solver.solve()" % name)
+    rnd = random.Random(seed)
+    num_checked = 0
+    for g in range(num_grids):
+        puzzle = Puzzle.from_clues(name, row_clues, col_clues)
+        reveal = rnd.uniform(0.3, 0.9)
+        error = 0.02 if g % 2 == 1 else 0.0  # odd grids have squares set wrong
+        for r in range(puzzle.rows):
+            for c in range(puzzle.cols):
+                if rnd.random() < reveal:
+                    if (solution[r] >> c & 1 == 1) != (rnd.random() < error):
+                        puzzle.set_filled(r, c)
+                    else:
+                        puzzle.set_blank(r, c)
+        snapshot = puzzle.snapshot()
+        dp = Solver(puzzle, ENGINE_DP, incremental=False)
+        combin = Solver(puzzle, ENGINE_COMBIN)
+        for is_row in (True, False):
+            puzzle.restore(snapshot)
+            numpy_results = numpy_lines(puzzle, is_row) if is_numpy_available() else None
+            for line_num in range(puzzle.rows if is_row else puzzle.cols):
+                results = {}
+                if numpy_results is not None:
+                    results["numpy"] = numpy_results[line_num]
+                puzzle.restore(snapshot)
+                if num_combinations(puzzle, line_num, is_row) <= MAX_COMBINATIONS:
+                    results[ENGINE_COMBIN] = engine_line(combin, puzzle, snapshot, line_num, is_row)
+                if not results:
+                    continue
+                num_checked += 1
+                dp_result = engine_line(dp, puzzle, snapshot, line_num, is_row)
+                for engine, result in results.items():
+                    if result != dp_result:
+                        mismatches.append("%s grid %d %s %d: dp gave %s, %s %s" % (
+                            name, g, "row" if is_row else "col", line_num, dp_result, engine, result))
+    return num_checked, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the line solving engines settle the same squares.")
+    parser.add_argument("--lib", default="lib", help="directory holding the clue files")
+    parser.add_argument("--lines", type=int, default=DEFAULT_NUM_LINES, help="random lines to check")
+    parser.add_argument("--max-length", type=int, default=DEFAULT_MAX_LENGTH, help="longest random line")
+    parser.add_argument("--grids", type=int, default=DEFAULT_NUM_GRIDS, help="partly known grids per puzzle")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not is_numpy_available():
+        print("NumPy is not installed, so the NumPy engine isn't checked")
+    mismatches = check_lines(args.lines, args.max_length, args.seed)
+    print("Random lines: %d checked, %d mismatches" % (args.lines, len(mismatches)))
+    for name, row_path, col_path in find_puzzles(args.lib):
+        num_checked, puzzle_mismatches = check_puzzle(name, Puzzle.read_clues_file(row_path),
+                                                      Puzzle.read_clues_file(col_path), args.grids, args.seed)
+        print("%s: %d lines checked, %d mismatches" % (name, num_checked, len(puzzle_mismatches)))
+        mismatches += puzzle_mismatches
+    for mismatch in mismatches:
+        print(mismatch)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
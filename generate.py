@@ -0,0 +1,156 @@
+import argparse
+import concurrent.futures
+import os
+import random
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from corpus import CorpusWriter
+from puzzle import Puzzle
+from search import SearchSolver
+from solver import SolveTimeout
+
+DEFAULT_DENSITY = 0.6
+BITMAP_FILLED = "#O1Xx"  # characters of a bitmap file that mean filled, anything else is blank
+
+Clues = List[List[int]]
+
+
+# A generated puzzle. num_solutions is 1 if the solution is unique, 2 if there are several, 0 if
+# something is wrong with the clues, and None if uniqueness wasn't checked or timed out.
+class GeneratedPuzzle(object):
+
+    def __init__(self, name: str, row_clues: Clues, col_clues: Clues, num_solutions: Optional[int],
+                 seconds: float):
+        self.name = name
+        self.row_clues = row_clues
+        self.col_clues = col_clues
+        self.num_solutions = num_solutions
+        self.seconds = seconds
+
+
+# Returns the rows of a random grid as bitmasks (bit c of a row set if square c is filled), each
+# square filled with the given probability. The same seed always gives the same grid.
+def random_grid(rows: int, cols: int, density: float, seed: int) -> List[int]:
+    rnd = random.Random(seed)
+    return [sum(1 << c for c in range(cols) if rnd.random() < density) for r in range(rows)]
+
+
+# Returns the rows of the grid drawn in a text file, one line per row, as bitmasks, and the
+# number of cols (the longest line). Characters in BITMAP_FILLED are filled squares.
+def read_bitmap(path: str) -> Tuple[List[int], int]:
+    with open(path, "r") as f:
+        lines = [line.rstrip("\n") for line in f]
+    while lines and not lines[-1].strip():
+        lines.pop()
+    row_masks = [sum(1 << c for c, ch in enumerate(line) if ch in BITMAP_FILLED) for line in lines]
+    return row_masks, max((len(line) for line in lines), default=0)
+
+
+# Returns (row clues, col clues) of a grid given as row bitmasks. The cols are read from the
+# transposed grid built as strings, so this stays fast for 1000x1000 grids.
+def clues_for_grid(row_masks: List[int], cols: int) -> Tuple[Clues, Clues]:
+    row_clues = [Puzzle.generate_clues_for_mask(mask, cols) for mask in row_masks]
+    if not row_masks or cols == 0:
+        return row_clues, [[] for c in range(cols)]
+    # bit c of a row is character c of its string
+    row_bits = [format(mask, "0%db" % cols)[::-1] for mask in row_masks]
+    col_clues = [[len(run) for run in "".join(col).split("0") if run] for col in zip(*row_bits)]
+    return row_clues, col_clues
+
+
+# Returns how many solutions the clues have, counting no further than limit, or None if that
+# takes more than timeout seconds.
+def count_solutions(row_clues: Clues, col_clues: Clues, limit: int = 2,
+                    timeout: Optional[float] = None) -> Optional[int]:
+    puzzle = Puzzle.from_clues("count", row_clues, col_clues)
+    try:
+        return SearchSolver(puzzle).count_solutions(limit, timeout)
+    except SolveTimeout:
+        return None
+
+
+# Builds one puzzle in a worker process. Random unless row_masks is given.
+def _generate_one(name: str, rows: int, cols: int, density: float, seed: int, check_unique: bool,
+                  timeout: Optional[float], row_masks: Optional[List[int]] = None) -> GeneratedPuzzle:
+    start_time = time.perf_counter()
+    if row_masks is None:
+        row_masks = random_grid(rows, cols, density, seed)
+    row_clues, col_clues = clues_for_grid(row_masks, cols)
+    num_solutions = count_solutions(row_clues, col_clues, 2, timeout) if check_unique else None
+    return GeneratedPuzzle(name, row_clues, col_clues, num_solutions, time.perf_counter() - start_time)
+
+
+# Generates count random puzzles across a pool of worker processes and yields them in the order
+# they finish. Puzzle i is named <prefix>_<i> and built from seed + i, so a run can be repeated.
+# check_unique: count solutions (up to 2) of every puzzle. timeout: seconds the count may take
+# per puzzle before num_solutions is left as None.
+def generate(count: int, rows: int, cols: int, density: float = DEFAULT_DENSITY, seed: int = 0,
+             workers: Optional[int] = None, check_unique: bool = True, timeout: Optional[float] = None,
+             prefix: Optional[str] = None) -> Iterator[GeneratedPuzzle]:
+    prefix = prefix or "random%dby%d" % (rows, cols)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_generate_one, "%s_%d" % (prefix, i), rows, cols, density, seed + i,
+                                   check_unique, timeout)
+                   for i in range(count)]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+# Writes a puzzle as a pair of clue files in a directory, eg. lib/<name>RowClues.txt and
+# lib/<name>ColClues.txt. Lines without clues are left empty.
+def write_clue_files(directory: str, puzzle: GeneratedPuzzle):
+    for path, clues in zip(Puzzle.clue_paths(directory, puzzle.name), (puzzle.row_clues, puzzle.col_clues)):
+        with open(path, "w") as f:
+            f.write("".join(" ".join(str(clue) for clue in line) + "\n" for line in clues))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate random puzzles, or a puzzle from a bitmap, and check "
+                                                 "that their solutions are unique.")
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--cols", type=int, help="defaults to --rows")
+    parser.add_argument("--density", type=float, default=DEFAULT_DENSITY, help="chance each square is filled")
+    parser.add_argument("--count", type=int, default=1, help="number of puzzles to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bitmap", help="text file to build one puzzle from instead, '#' for filled squares")
+    parser.add_argument("--name", help="name of the puzzles (numbered) or of the bitmap puzzle")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--no-check", action="store_true", help="don't check that solutions are unique")
+    parser.add_argument("--unique-only", action="store_true", help="only write puzzles known to be unique")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds the uniqueness check may take")
+    parser.add_argument("--out", default="lib", help="directory the clue files are written to")
+    parser.add_argument("--corpus", help="write to this corpus file (see corpus.py) instead of clue files")
+    parser.add_argument("--binary", action="store_true", help="write the corpus in its binary variant")
+    args = parser.parse_args()
+    if args.bitmap:
+        row_masks, cols = read_bitmap(args.bitmap)
+        name = args.name or os.path.splitext(os.path.basename(args.bitmap))[0]
+        puzzles = iter([_generate_one(name, len(row_masks), cols, 0, 0, not args.no_check, args.timeout, row_masks)])
+    else:
+        puzzles = generate(args.count, args.rows, args.cols or args.rows, args.density, args.seed, args.workers,
+                           not args.no_check, args.timeout, args.name)
+    writer = CorpusWriter(args.corpus, args.binary) if args.corpus else None
+    num_written = 0
+    try:
+        for puzzle in puzzles:
+            status = {None: "unchecked", 0: "no solution", 1: "unique", 2: "not unique"}[puzzle.num_solutions]
+            print("%s: %s in %.4f seconds" % (puzzle.name, status, puzzle.seconds))
+            if args.unique_only and puzzle.num_solutions != 1:
+                continue
+            if writer is not None:
+                writer.add(puzzle.name, puzzle.row_clues, puzzle.col_clues)
+            else:
+                write_clue_files(args.out, puzzle)
+            num_written += 1
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
+    print("Wrote %d puzzles to %s" % (num_written, args.corpus or args.out))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import collections
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+# Phases time is spent in, besides line solving itself
+PHASE_LINE_SOLVE = "line_solve"
+PHASE_SOLVED_CHECK = "solved_check"
+PHASE_RENDER = "render"
+PHASE_IO = "io"
+
+
+# Counters for one line (row or col).
+class LineStats(object):
+
+    def __init__(self):
+        self.solves = 0
+        self.skips = 0  # queued solves skipped because the line's block ranges couldn't narrow
+        self.placements = 0  # candidate block placements examined by the line solver
+        self.settled = 0  # squares newly settled by solving this line
+        self.ns = 0  # time spent solving this line
+
+
+# Collects where a solve spends its time. Attach one to a Solver with set_instrumentation();
+# when none is attached the hooks in Solver and Puzzle cost a single None check.
+class Instrumentation(object):
+
+    def __init__(self):
+        self._rows = collections.defaultdict(LineStats)
+        self._cols = collections.defaultdict(LineStats)
+        self._phase_ns = collections.defaultdict(int)
+        self._phase_calls = collections.defaultdict(int)
+
+    # Records one line solve, called by Solver._update_line().
+    def line_solved(self, line_num: int, is_row: bool, placements: int, settled: int, ns: int):
+        stats = (self._rows if is_row else self._cols)[line_num]
+        stats.solves += 1
+        stats.placements += placements
+        stats.settled += settled
+        stats.ns += ns
+        self._phase_ns[PHASE_LINE_SOLVE] += ns
+        self._phase_calls[PHASE_LINE_SOLVE] += 1
+
+    # Records a line solve the solver skipped, called by Solver._propagate_line().
+    def line_skipped(self, line_num: int, is_row: bool):
+        (self._rows if is_row else self._cols)[line_num].skips += 1
+
+    def add_phase_time(self, phase: str, ns: int):
+        self._phase_ns[phase] += ns
+        self._phase_calls[phase] += 1
+
+    # Times the body of a with block as the given phase.
+    @contextlib.contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add_phase_time(phase, time.perf_counter_ns() - start_ns)
+
+    def get_line_stats(self, line_num: int, is_row: bool) -> LineStats:
+        return (self._rows if is_row else self._cols)[line_num]
+
+    # Returns a JSON friendly summary: totals, time and calls per phase, and the top_lines lines
+    # that took the longest to solve.
+    def to_dict(self, top_lines: int = 10) -> Dict[str, Any]:
+        lines = [("row", i, stats) for i, stats in self._rows.items()] \
+            + [("col", i, stats) for i, stats in self._cols.items()]
+        lines.sort(key=lambda line: line[2].ns, reverse=True)
+        return {"line_solves": sum(stats.solves for kind, i, stats in lines),
+                "skipped_solves": sum(stats.skips for kind, i, stats in lines),
+                "placements": sum(stats.placements for kind, i, stats in lines),
+                "settled": sum(stats.settled for kind, i, stats in lines),
+                "phases": {phase: {"ns": self._phase_ns[phase], "calls": self._phase_calls[phase]}
+                           for phase in self._phase_ns},
+                "slowest_lines": [{"line": kind, "index": i, "solves": stats.solves, "skips": stats.skips,
+                                   "placements": stats.placements,
+                                   "settled": stats.settled, "ns": stats.ns}
+                                  for kind, i, stats in lines[:top_lines]]}
+
+    def to_json(self, top_lines: int = 10) -> str:
+        return json.dumps(self.to_dict(top_lines), indent=2)
+
+
+# Runs func under cProfile. Returns its result and the profile's report, sorted by sort_by and
+# cut to the top limit functions.
+def run_profiled(func: Callable[[], Any], sort_by: str = "cumulative", limit: int = 30) -> Tuple[Any, str]:
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats(sort_by).print_stats(limit)
+    return result, out.getvalue()
+
+
+# Low overhead alternative to cProfile: a background thread samples the stack of the thread
+# that started it every interval seconds, and counts the innermost function of each sample.
+# Ex:
+# with SamplingProfiler() as profiler:
+#     solver.solve()
+# print(profiler.get_top())
+class SamplingProfiler(object):
+
+    def __init__(self, interval: float = 0.001):
+        self._interval = interval
+        self._counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target_id = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._target_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self._interval):
+            frame = sys._current_frames().get(self._target_id)
+            if frame is not None:
+                code = frame.f_code
+                self._counts["%s:%d %s" % (os.path.basename(code.co_filename), code.co_firstlineno, code.co_name)] += 1
+
+    # Returns (function, number of samples) for the functions sampled most often.
+    def get_top(self, limit: int = 20) -> List[Tuple[str, int]]:
+        return self._counts.most_common(limit)
+
+
+def main():
+    # imported here since solver.py and puzzle.py import this module
+    from puzzle import Puzzle
+    from search import SearchSolver
+
+    parser = argparse.ArgumentParser(description="Solve a puzzle with instrumentation and print where time went.")
+    parser.add_argument("name", nargs="?", default="50by50")
+    parser.add_argument("--lib", default="lib", help="directory holding the clue files")
+    parser.add_argument("--profile", choices=["cprofile", "sampling"], help="also run a profiler")
+    args = parser.parse_args()
+    puzzle = Puzzle.from_directory(args.name, args.lib)
+    solver = SearchSolver(puzzle)
+    instrumentation = Instrumentation()
+    solver.set_instrumentation(instrumentation)
+    if args.profile == "cprofile":
+        report = run_profiled(solver.solve)[1]
+        print(report)
+    elif args.profile == "sampling":
+        with SamplingProfiler() as profiler:
+            solver.solve()
+        for function, count in profiler.get_top():
+            print("%6d %s" % (count, function))
+    else:
+        solver.solve()
+    print(instrumentation.to_json())
+
+
+if __name__ == "__main__":
+    main()
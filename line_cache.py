@@ -0,0 +1,94 @@
+import collections
+import os
+import pickle
+from typing import Dict, Optional, Sequence
+
+from atomic_file import AtomicWriter
+from line_solver import LineSolution, solve_line
+
+DEFAULT_MAX_SIZE = 100000
+
+
+# Memoizes solve_line(). Entries are keyed by (clue tuple, line length, known mask, filled mask)
+# and evicted least recently used first once there are more than max_size of them. One cache
+# can be shared by any number of Solvers, and saved to disk to be reused between runs.
+class LineCache(object):
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        if max_size < 1:
+            raise ValueError("Cache size must be at least 1, got " + str(max_size))
+        self._max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # Same as solve_line(), but returns the cached solution if the line has been solved before.
+    def solve(self, clues: Sequence[int], length: int, known: int, filled: int) -> Optional[LineSolution]:
+        key = (tuple(clues), length, known, filled)
+        if key in self._entries:
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self._misses += 1
+        solution = solve_line(clues, length, known, filled)
+        self._entries[key] = solution
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+        return solution
+
+    def get_hits(self) -> int:
+        return self._hits
+
+    def get_misses(self) -> int:
+        return self._misses
+
+    def get_evictions(self) -> int:
+        return self._evictions
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries),
+                "max_size": self._max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions}
+
+    def clear(self):
+        self._entries.clear()
+
+    # Writes the entries to a file, least recently used first. Several processes can save to the
+    # same path at once: the file holds whichever save finished last (see AtomicWriter).
+    def save(self, path: str):
+        with AtomicWriter(path, "wb") as f:
+            pickle.dump(list(self._entries.items()), f, pickle.HIGHEST_PROTOCOL)
+
+    # Adds the entries saved in a file by save(). Entries already in the cache are kept, and the
+    # least recently used entries are evicted if the cache overflows. Does nothing if the file
+    # doesn't exist yet.
+    def load(self, path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            items = pickle.load(f)
+        for key, solution in reversed(items):
+            if key not in self._entries:
+                self._entries[key] = solution
+                self._entries.move_to_end(key, last=False)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_shared_cache = None
+
+
+# Returns the cache shared by every Solver in the process that asks for it.
+def get_shared_cache() -> LineCache:
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = LineCache()
+    return _shared_cache
@@ -0,0 +1,168 @@
+from typing import List, Optional, Sequence, Tuple
+
+from square import Square
+
+
+# The result of solving a single line. known and filled are bitmasks where bit i describes
+# square i of the line: a set bit in known means the square's state is settled, and a set bit
+# in filled means it is settled as filled. leftmost and rightmost hold the first and last
+# feasible start index of each block (clue) in the line.
+class LineSolution(object):
+
+    def __init__(self, known: int, filled: int, leftmost: List[int], rightmost: List[int]):
+        self._known = known
+        self._filled = filled
+        self._leftmost = leftmost
+        self._rightmost = rightmost
+
+    def get_known(self) -> int:
+        return self._known
+
+    def get_filled(self) -> int:
+        return self._filled
+
+    def get_leftmost(self) -> List[int]:
+        return self._leftmost
+
+    def get_rightmost(self) -> List[int]:
+        return self._rightmost
+
+
+# Converts a list of squares (a line) into a (known, filled) pair of bitmasks.
+def line_to_masks(line: List[Square]) -> Tuple[int, int]:
+    known = 0
+    filled = 0
+    for i in range(len(line)):
+        if not line[i].is_unknown():
+            known |= 1 << i
+            if line[i].is_filled():
+                filled |= 1 << i
+    return known, filled
+
+
+# Applies the simple boxes and simple spaces rules to an empty line: with every block packed as
+# far left as it goes and as far right, a block longer than the slack covers the same middle
+# squares both ways, so they're filled, and squares no block can reach are blank. Needs only the
+# clues, so it's O(number of clues) big int operations. Returns the squares it decides as
+# (known, filled) masks, or None if the clues don't fit in the line.
+# Ex:
+# clues = [4, 1], length = 7
+# return: filled = .OOO..., known the same (slack 1: block 0 spans [0, 4) or [1, 5))
+def overlap_masks(clues: Sequence[int], length: int) -> Optional[Tuple[int, int]]:
+    clues = [clue for clue in clues if clue > 0]
+    slack = length - (sum(clues) + len(clues) - 1) if clues else length
+    if slack < 0:
+        return None
+    filled = 0
+    reachable = 0
+    start = 0  # leftmost start of the current block
+    for clue in clues:
+        if clue > slack:
+            filled |= ((1 << (clue - slack)) - 1) << (start + slack)
+        reachable |= ((1 << (clue + slack)) - 1) << start
+        start += clue + 1
+    return filled | ((1 << length) - 1) & ~reachable, filled
+
+
+# Dynamic programming line solver. Runs in O(length * number of clues).
+# fwd[j][i] is True if squares [0, i) can hold exactly the first j blocks, and bwd[j][i] is
+# True if squares [i, length) can hold exactly blocks j and onwards. A block j placed at
+# start s is feasible if it covers no blank square and both sides of it can be completed, so
+# a square can be filled if some feasible placement covers it, and can be blank if some j
+# has fwd[j][i] and bwd[j][i + 1].
+# Returns None if no arrangement of the clues matches the known squares.
+# Ex:
+# clues = [3], length = 5, nothing known
+# return: filled = ..O.. (the middle square is in every placement), leftmost = [0], rightmost = [2]
+def solve_line(clues: Sequence[int], length: int, known: int, filled: int) -> Optional[LineSolution]:
+    clues = [clue for clue in clues if clue > 0]
+    num_clues = len(clues)
+    can_blank = [not (known >> i & 1 and filled >> i & 1) for i in range(length)]
+    # blank_prefix[i] is the number of known blank squares in [0, i), so a block fits
+    # at [s, e) iff blank_prefix[e] == blank_prefix[s]
+    blank_prefix = [0] * (length + 1)
+    for i in range(length):
+        is_blank = known >> i & 1 and not filled >> i & 1
+        blank_prefix[i + 1] = blank_prefix[i] + (1 if is_blank else 0)
+
+    fwd = [[False] * (length + 1) for j in range(num_clues + 1)]
+    fwd[0][0] = True
+    for i in range(1, length + 1):
+        fwd[0][i] = fwd[0][i - 1] and can_blank[i - 1]
+    for j in range(1, num_clues + 1):
+        clue = clues[j - 1]
+        row = fwd[j]
+        prev = fwd[j - 1]
+        for i in range(1, length + 1):
+            ok = row[i - 1] and can_blank[i - 1]  # square i - 1 is blank
+            s = i - clue
+            if not ok and s >= 0 and blank_prefix[i] == blank_prefix[s]:  # block j - 1 ends at i
+                ok = j == 1 if s == 0 else can_blank[s - 1] and prev[s - 1]
+            row[i] = ok
+    if not fwd[num_clues][length]:
+        return None
+
+    bwd = [[False] * (length + 1) for j in range(num_clues + 1)]
+    bwd[num_clues][length] = True
+    for i in range(length - 1, -1, -1):
+        bwd[num_clues][i] = bwd[num_clues][i + 1] and can_blank[i]
+    for j in range(num_clues - 1, -1, -1):
+        clue = clues[j]
+        row = bwd[j]
+        nxt = bwd[j + 1]
+        for i in range(length - 1, -1, -1):
+            ok = row[i + 1] and can_blank[i]  # square i is blank
+            e = i + clue
+            if not ok and e <= length and blank_prefix[e] == blank_prefix[i]:  # block j starts at i
+                ok = j == num_clues - 1 if e == length else can_blank[e] and nxt[e + 1]
+            row[i] = ok
+
+    return _settle_squares(clues, length, known, filled, can_blank, blank_prefix, fwd, bwd)
+
+
+# Combines the forward and backward tables into the squares that are the same in every
+# arrangement of the line, along with the range of feasible starts for each block.
+def _settle_squares(clues: List[int], length: int, known: int, filled: int, can_blank: List[bool],
+                    blank_prefix: List[int], fwd: List[List[bool]], bwd: List[List[bool]]) -> Optional[LineSolution]:
+    num_clues = len(clues)
+    # coverage[i] counts feasible placements covering square i, via a difference array
+    coverage = [0] * (length + 1)
+    leftmost = [0] * num_clues
+    rightmost = [0] * num_clues
+    for j in range(num_clues):
+        clue = clues[j]
+        left = fwd[j]
+        right = bwd[j + 1]
+        first = -1
+        last = -1
+        for s in range(length - clue + 1):
+            e = s + clue
+            if blank_prefix[e] != blank_prefix[s]:
+                continue
+            if not (j == 0 if s == 0 else can_blank[s - 1] and left[s - 1]):
+                continue
+            if not (j == num_clues - 1 if e == length else can_blank[e] and right[e + 1]):
+                continue
+            coverage[s] += 1
+            coverage[e] -= 1
+            if first < 0:
+                first = s
+            last = s
+        leftmost[j] = first
+        rightmost[j] = last
+
+    new_known = known
+    new_filled = filled
+    covered = 0
+    for i in range(length):
+        covered += coverage[i]
+        could_fill = covered > 0
+        could_blank = can_blank[i] and any(fwd[j][i] and bwd[j][i + 1] for j in range(num_clues + 1))
+        if could_fill and not could_blank:
+            new_known |= 1 << i
+            new_filled |= 1 << i
+        elif could_blank and not could_fill:
+            new_known |= 1 << i
+        elif not could_fill and not could_blank:
+            return None
+    return LineSolution(new_known, new_filled, leftmost, rightmost)
@@ -0,0 +1,165 @@
+from typing import List, Tuple
+
+from puzzle import Puzzle
+from solver import RoundSolver
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Square states in the int8 grid
+NP_UNKNOWN = 0
+NP_FILLED = 1
+NP_BLANK = 2
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+# Returns the clues of many lines as a 2D array padded with zeros on the right, along with
+# the number of clues in each line.
+# Ex:
+# clues = [[3, 1], [2], []]
+# return: [[3, 1], [2, 0], [0, 0]], [2, 1, 0]
+def pad_clues(clues: List[List[int]]) -> Tuple["np.ndarray", "np.ndarray"]:
+    clues = [[clue for clue in line if clue > 0] for line in clues]
+    counts = np.array([len(line) for line in clues], dtype=np.int64)
+    padded = np.zeros((len(clues), max(1, int(counts.max(initial=0)))), dtype=np.int64)
+    for i in range(len(clues)):
+        padded[i, :len(clues[i])] = clues[i]
+    return padded, counts
+
+
+# Vectorized version of line_solver.solve_line() for many lines of the same length at once.
+# lines is an int8 array with one line per row (NP_UNKNOWN, NP_FILLED or NP_BLANK), and clues
+# and counts come from pad_clues(). Returns the lines with every square that is the same in all
+# arrangements settled, and a bool array that is False for lines with no arrangement (those
+# lines are returned unchanged).
+def solve_lines(lines: "np.ndarray", clues: "np.ndarray", counts: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    num_lines, length = lines.shape
+    max_clues = clues.shape[1]
+    idx = np.arange(num_lines)[:, None]
+    positions = np.arange(length + 1)[None, :]
+    can_blank = lines != NP_FILLED
+    # blank_prefix[:, i] and filled_prefix[:, i] are the number of known blank and known
+    # filled squares in [0, i)
+    blank_prefix = np.zeros((num_lines, length + 1), dtype=np.int64)
+    np.cumsum(lines == NP_BLANK, axis=1, out=blank_prefix[:, 1:])
+    filled_prefix = np.zeros((num_lines, length + 1), dtype=np.int64)
+    np.cumsum(lines == NP_FILLED, axis=1, out=filled_prefix[:, 1:])
+    # padding so that can_blank_at[:, i] is square i - 1, and the square before 0 is blank
+    can_blank_at = np.ones((num_lines, length + 2), dtype=bool)
+    can_blank_at[:, 1:length + 1] = can_blank
+
+    # fwd[j][:, i]: squares [0, i) can hold exactly the first j blocks. That is the case if
+    # block j - 1 can end at some t <= i and squares [t, i) can all be blank, so only the last
+    # such t needs checking.
+    fwd = np.zeros((max_clues + 1, num_lines, length + 1), dtype=bool)
+    fwd[0] = filled_prefix == 0
+    for j in range(1, max_clues + 1):
+        s = positions - clues[:, j - 1][:, None]  # start of block j - 1 if it ends at i
+        start = np.maximum(s, 0)
+        fits = (s >= 0) & (blank_prefix == blank_prefix[idx, start])
+        before = np.maximum(s - 1, 0)
+        left = np.where(s == 0, j == 1, can_blank_at[idx, before + 1] & fwd[j - 1][idx, before])
+        ends = fits & left & (j <= counts)[:, None]
+        last_end = np.maximum.accumulate(np.where(ends, positions, -1), axis=1)
+        fwd[j] = (last_end >= 0) & (filled_prefix == filled_prefix[idx, np.maximum(last_end, 0)])
+    is_consistent = fwd[counts, np.arange(num_lines), length]
+
+    # bwd[j][:, i]: squares [i, length) can hold exactly blocks j and onwards. That is the case
+    # if block j can start at some t >= i (or t = length if there are no blocks left) and
+    # squares [i, t) can all be blank, so only the first such t needs checking.
+    bwd = np.zeros((max_clues + 1, num_lines, length + 1), dtype=bool)
+    for j in range(max_clues, -1, -1):
+        e = positions + clues[:, min(j, max_clues - 1)][:, None]  # end of block j if it starts at i
+        end = np.minimum(e, length)
+        fits = (e <= length) & (blank_prefix[idx, end] == blank_prefix)
+        after = np.minimum(e + 1, length)
+        next_bwd = bwd[min(j + 1, max_clues)]
+        right = np.where(e == length, (j == counts - 1)[:, None],
+                         can_blank_at[idx, np.minimum(e, length) + 1] & next_bwd[idx, after])
+        starts = fits & right & (j < counts)[:, None]
+        starts[:, length] = counts == j
+        first_start = np.minimum.accumulate(np.where(starts, positions, length + 1)[:, ::-1], axis=1)[:, ::-1]
+        bwd[j] = (first_start <= length) & (filled_prefix[idx, np.minimum(first_start, length)] == filled_prefix)
+
+    # a square can be blank if some j has fwd[j][:, i] and bwd[j][:, i + 1]
+    could_blank = can_blank & (fwd[:, :, :length] & bwd[:, :, 1:]).any(axis=0)
+    # a square can be filled if a feasible placement of some block covers it
+    could_fill = np.zeros((num_lines, length), dtype=bool)
+    starts = np.arange(length)
+    for j in range(max_clues):
+        clue = clues[:, j][:, None]
+        e = starts[None, :] + clue
+        end = np.minimum(e, length)
+        fits = (e <= length) & (np.take_along_axis(blank_prefix, end, axis=1) == blank_prefix[:, :length])
+        before = np.maximum(starts - 1, 0)
+        left = can_blank[:, before] & fwd[j][:, before]
+        left[:, 0] = j == 0
+        right_end = np.take_along_axis(can_blank, np.minimum(e, length - 1), axis=1) \
+            & np.take_along_axis(bwd[j + 1], np.minimum(e + 1, length), axis=1)
+        right = np.where(e == length, (j == counts - 1)[:, None], right_end)
+        valid = fits & left & right & (j < counts)[:, None]
+        # square i is covered if a valid start lies in (i - clue, i]
+        num_starts = np.zeros((num_lines, length + 1), dtype=np.int64)
+        np.cumsum(valid, axis=1, out=num_starts[:, 1:])
+        first = np.maximum(starts[None, :] + 1 - clue, 0)
+        could_fill |= num_starts[:, 1:] > np.take_along_axis(num_starts, first, axis=1)
+
+    is_consistent &= ~(~could_fill & ~could_blank).any(axis=1)
+    solved = lines.copy()
+    solved[could_fill & ~could_blank] = NP_FILLED
+    solved[could_blank & ~could_fill] = NP_BLANK
+    solved[~is_consistent] = lines[~is_consistent]
+    return solved, is_consistent
+
+
+# Solver that solves every row in one vectorized call, then every col through the transposed
+# grid, until a round settles no squares. Needs NumPy.
+class NumpySolver(RoundSolver):
+
+    def __init__(self, puzzle: Puzzle):
+        if np is None:
+            raise ImportError("NumpySolver needs NumPy, which is not installed")
+        super().__init__(puzzle)
+        self._row_clues, self._row_counts = pad_clues([puzzle.get_clues(r, True) for r in range(puzzle.rows)])
+        self._col_clues, self._col_counts = pad_clues([puzzle.get_clues(c, False) for c in range(puzzle.cols)])
+
+    def _solve_rounds(self):
+        grid = self.get_grid()
+        is_row = True
+        num_idle_rounds = 0
+        while num_idle_rounds < 2 and not self._puzzle.is_solved():
+            self._check_deadline()
+            lines = grid if is_row else grid.T
+            clues, counts = (self._row_clues, self._row_counts) if is_row else (self._col_clues, self._col_counts)
+            solved, is_consistent = solve_lines(lines, clues, counts)
+            self._num_line_solves += len(lines)
+            self._num_rounds += 1
+            if not is_consistent.all():
+                break
+            changed = np.argwhere(solved != lines)
+            num_idle_rounds = 0 if len(changed) > 0 else num_idle_rounds + 1
+            for line_num, i in changed:
+                r, c = (line_num, i) if is_row else (i, line_num)
+                if solved[line_num, i] == NP_FILLED:
+                    self._puzzle.set_filled(int(r), int(c))
+                else:
+                    self._puzzle.set_blank(int(r), int(c))
+            lines[...] = solved
+            is_row = not is_row
+
+    # Returns the puzzle's grid as an int8 array of NP_UNKNOWN, NP_FILLED and NP_BLANK.
+    def get_grid(self) -> "np.ndarray":
+        grid = np.zeros((self._puzzle.rows, self._puzzle.cols), dtype=np.int8)
+        for r in range(self._puzzle.rows):
+            known, filled = self._puzzle.get_line_masks(r, True)
+            for c in range(self._puzzle.cols):
+                if filled >> c & 1:
+                    grid[r, c] = NP_FILLED
+                elif known >> c & 1:
+                    grid[r, c] = NP_BLANK
+        return grid
@@ -0,0 +1,160 @@
+import argparse
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+from typing import List, Optional, Sequence, Set, Tuple
+
+from line_solver import solve_line
+from puzzle import Puzzle
+from solver import RoundSolver
+
+# Square states in the shared grid, one byte per square, row by row
+SHARED_UNKNOWN = 0
+SHARED_FILLED = 1
+SHARED_BLANK = 2
+
+# Set in each worker process by _init_worker()
+_worker_shm = None
+_worker_rows = 0
+_worker_cols = 0
+_worker_row_clues = None
+_worker_col_clues = None
+
+
+def _init_worker(shm_name: str, rows: int, cols: int, row_clues: List[List[int]], col_clues: List[List[int]]):
+    global _worker_shm, _worker_rows, _worker_cols, _worker_row_clues, _worker_col_clues
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_rows = rows
+    _worker_cols = cols
+    _worker_row_clues = row_clues
+    _worker_col_clues = col_clues
+
+
+# Solves lines in a worker, reading them from the shared grid. Returns (index, known, filled)
+# for each line that changed, where known holds only the newly settled squares, or None if a
+# line has no solution.
+def _solve_lines(is_row: bool, indices: List[int]) -> Optional[List[Tuple[int, int, int]]]:
+    buf = _worker_shm.buf
+    length = _worker_cols if is_row else _worker_rows
+    deltas = []
+    for line_num in indices:
+        if is_row:
+            squares = buf[line_num * _worker_cols:(line_num + 1) * _worker_cols]
+        else:
+            squares = buf[line_num:_worker_rows * _worker_cols:_worker_cols]
+        known = 0
+        filled = 0
+        for i in range(length):
+            if squares[i] != SHARED_UNKNOWN:
+                known |= 1 << i
+                if squares[i] == SHARED_FILLED:
+                    filled |= 1 << i
+        squares.release()
+        clues = _worker_row_clues[line_num] if is_row else _worker_col_clues[line_num]
+        solution = solve_line(clues, length, known, filled)
+        if solution is None:
+            return None
+        new_known = solution.get_known() & ~known
+        if new_known:
+            deltas.append((line_num, new_known, solution.get_filled() & new_known))
+    return deltas
+
+
+# Solver for very large puzzles that solves all dirty rows of a round in parallel, then all
+# dirty cols, across worker processes. The grid lives in shared memory so workers read the
+# lines themselves, and only the newly settled squares are sent back. A line is dirty if a
+# square in it was settled in the previous round.
+# workers: number of worker processes. None for one per CPU.
+class ParallelSolver(RoundSolver):
+
+    def __init__(self, puzzle: Puzzle, workers: Optional[int] = None):
+        super().__init__(puzzle)
+        self._workers = workers or os.cpu_count() or 1
+
+    def _solve_rounds(self):
+        rows = self._puzzle.rows
+        cols = self._puzzle.cols
+        shm = shared_memory.SharedMemory(create=True, size=max(1, rows * cols))
+        try:
+            for r in range(rows):
+                for c in range(cols):
+                    shm.buf[r * cols + c] = self._to_shared(r, c)
+            row_clues = [self._puzzle.get_clues(r, True) for r in range(rows)]
+            col_clues = [self._puzzle.get_clues(c, False) for c in range(cols)]
+            with multiprocessing.Pool(self._workers, _init_worker, (shm.name, rows, cols, row_clues, col_clues)) as pool:
+                # lines with squares settled since they were last solved, by is_row
+                dirty = {True: set(range(rows)), False: set(range(cols))}
+                is_row = True
+                while (dirty[True] or dirty[False]) and not self._puzzle.is_solved():
+                    self._check_deadline()
+                    lines = sorted(dirty[is_row])
+                    dirty[is_row] = set()
+                    if len(lines) > 0:
+                        changed = self._solve_round(pool, shm, is_row, lines)
+                        if changed is None:
+                            break
+                        dirty[not is_row].update(changed)
+                    is_row = not is_row
+        finally:
+            shm.close()
+            shm.unlink()
+
+    # Solves the given lines in parallel and applies the results to the puzzle and the shared
+    # grid. Returns the indices of crossing lines that changed, or None on a contradiction.
+    def _solve_round(self, pool, shm: shared_memory.SharedMemory, is_row: bool, indices: List[int]) -> Optional[Set[int]]:
+        self._num_rounds += 1
+        self._num_line_solves += len(indices)
+        chunks = [indices[i::self._workers] for i in range(min(self._workers, len(indices)))]
+        crossing = set()
+        cols = self._puzzle.cols
+        for deltas in pool.starmap(_solve_lines, [(is_row, chunk) for chunk in chunks]):
+            if deltas is None:
+                return None
+            for line_num, new_known, new_filled in deltas:
+                i = 0
+                while new_known >> i:
+                    if new_known >> i & 1:
+                        r = line_num if is_row else i
+                        c = i if is_row else line_num
+                        if new_filled >> i & 1:
+                            self._puzzle.set_filled(r, c)
+                            shm.buf[r * cols + c] = SHARED_FILLED
+                        else:
+                            self._puzzle.set_blank(r, c)
+                            shm.buf[r * cols + c] = SHARED_BLANK
+                        crossing.add(i)
+                    i += 1
+        return crossing
+
+    def _to_shared(self, r: int, c: int) -> int:
+        if self._puzzle.is_filled(r, c):
+            return SHARED_FILLED
+        return SHARED_BLANK if self._puzzle.is_blank(r, c) else SHARED_UNKNOWN
+
+
+# Solves the same puzzle with each number of workers and returns (workers, seconds) pairs.
+def measure_scaling(name: str, row_clues_path: str, col_clues_path: str,
+                    worker_counts: Sequence[int] = (1, 2, 4, 8)) -> List[Tuple[int, float]]:
+    timings = []
+    for workers in worker_counts:
+        puzzle = Puzzle(name, row_clues_path, col_clues_path)
+        start_time = time.perf_counter()
+        ParallelSolver(puzzle, workers).solve()
+        timings.append((workers, time.perf_counter() - start_time))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how parallel line solving scales with workers.")
+    parser.add_argument("name", nargs="?", default="50by50")
+    parser.add_argument("--lib", default="lib", help="directory holding the clue files")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    row_path, col_path = Puzzle.clue_paths(args.lib, args.name)
+    for workers, seconds in measure_scaling(args.name, row_path, col_path, args.workers):
+        print("workers = %d: %.4f seconds" % (workers, seconds))
+
+
+if __name__ == "__main__":
+    main()
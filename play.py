@@ -0,0 +1,331 @@
+import argparse
+import sys
+from typing import List, Optional, Set, Tuple
+
+from puzzle import Puzzle
+from render import SQUARES_PER_SECTION
+
+try:
+    import pygame
+except ImportError:
+    pygame = None
+
+# State of each clue, shown next to it while playing
+CLUE_OPEN = 0  # not decided yet
+CLUE_SATISFIED = 1  # a finished run of filled squares matches it
+CLUE_VIOLATED = 2  # a finished run that should match it doesn't, or the line has too many runs
+
+CELL_SIZE = 20
+FRAMES_PER_SECOND = 60
+COLOR_BACKGROUND = (255, 255, 255)
+COLOR_UNKNOWN = (235, 235, 235)
+COLOR_FILLED = (40, 40, 40)
+COLOR_BLANK_MARK = (150, 150, 150)
+COLOR_GRID = (180, 180, 180)
+COLOR_SECTION = (60, 60, 60)
+CLUE_COLORS = {CLUE_OPEN: (0, 0, 0), CLUE_SATISFIED: (170, 170, 170), CLUE_VIOLATED: (210, 30, 30)}
+TEXT_MARKERS = {CLUE_OPEN: "", CLUE_SATISFIED: "+", CLUE_VIOLATED: "!"}
+
+
+# Reverses the order of the first length bits of mask.
+def _reverse_bits(mask: int, length: int) -> int:
+    return int(format(mask, "0%db" % length)[::-1], 2) if length > 0 else 0
+
+
+# Returns the runs of filled squares at the start of a line that can no longer change: those
+# before the first unknown square, except a run that touches it.
+def _finished_runs(length: int, known: int, filled: int) -> List[int]:
+    prefix = min((~known & (known + 1)).bit_length() - 1, length)  # squares before the first unknown
+    runs = Puzzle.generate_clues_for_mask(filled & ((1 << prefix) - 1), prefix)
+    if runs and prefix < length and filled >> (prefix - 1) & 1:
+        runs.pop()
+    return runs
+
+
+# Returns the number of stretches between blank squares that hold a filled square. Runs in the
+# same stretch may still join up, but runs in different stretches never can.
+def _num_filled_stretches(length: int, known: int, filled: int) -> int:
+    not_blank = ~(known & ~filled) & ((1 << length) - 1)
+    count = 0
+    while not_blank:
+        # the lowest stretch: adding its lowest bit carries through it
+        stretch = not_blank ^ (not_blank & (not_blank + (not_blank & -not_blank)))
+        if stretch & filled:
+            count += 1
+        not_blank &= ~stretch
+    return count
+
+
+# Returns CLUE_OPEN, CLUE_SATISFIED or CLUE_VIOLATED for each clue of a line, in O(line length).
+# Finished runs at either end of the line are matched to the clues in order from that end. Every
+# clue is violated if the line needs more runs than it has clues, or has a run longer than any
+# clue, since runs only ever grow.
+def clue_markers(clues: List[int], length: int, known: int, filled: int) -> List[int]:
+    runs = Puzzle.generate_clues_for_mask(filled, length)
+    if runs == clues:
+        return [CLUE_SATISFIED] * len(clues)
+    if (runs and not clues) or (runs and max(runs) > max(clues)) \
+            or _num_filled_stretches(length, known, filled) > len(clues):
+        return [CLUE_VIOLATED] * len(clues)
+    markers = [CLUE_OPEN] * len(clues)
+    for i, run in enumerate(_finished_runs(length, known, filled)[:len(clues)]):
+        markers[i] = CLUE_SATISFIED if run == clues[i] else CLUE_VIOLATED
+    right_runs = _finished_runs(length, _reverse_bits(known, length), _reverse_bits(filled, length))
+    for i, run in enumerate(right_runs[:len(clues)]):
+        j = len(clues) - 1 - i
+        if run != clues[j]:
+            markers[j] = CLUE_VIOLATED
+        elif markers[j] == CLUE_OPEN:
+            markers[j] = CLUE_SATISFIED
+    return markers
+
+
+# The state of a game in progress. Each move only re-checks the row and col it touches, and
+# the puzzle counts as complete once the filled squares of every line match its clues (squares
+# don't have to be marked blank), which is tracked with a counter so is_complete() is O(1).
+# The squares and clue labels that need redrawing are collected until take_dirty() is called.
+class PlayState(object):
+
+    def __init__(self, puzzle: Puzzle):
+        self._puzzle = puzzle
+        self._row_clues = [[clue for clue in puzzle.get_clues(r, True) if clue > 0] for r in range(puzzle.rows)]
+        self._col_clues = [[clue for clue in puzzle.get_clues(c, False) if clue > 0] for c in range(puzzle.cols)]
+        self._row_markers = [[] for r in range(puzzle.rows)]  # type: List[List[int]]
+        self._col_markers = [[] for c in range(puzzle.cols)]  # type: List[List[int]]
+        self._row_done = [False] * puzzle.rows
+        self._col_done = [False] * puzzle.cols
+        self._num_done = 0
+        self._dirty_squares = set()  # type: Set[Tuple[int, int]]
+        self._dirty_clues = set()  # type: Set[Tuple[int, bool]]
+        for r in range(puzzle.rows):
+            self._update_line(r, True)
+        for c in range(puzzle.cols):
+            self._update_line(c, False)
+
+    def get_puzzle(self) -> Puzzle:
+        return self._puzzle
+
+    # Toggles square (r, c) between filled and unknown. Returns False if there's no such square.
+    def fill(self, r: int, c: int) -> bool:
+        if not self._puzzle.manual_fill(r, c):
+            return False
+        self._square_changed(r, c)
+        return True
+
+    # Toggles square (r, c) between marked blank and unknown. Returns False if there's no such
+    # square.
+    def blank(self, r: int, c: int) -> bool:
+        if not self._puzzle.manual_blank(r, c):
+            return False
+        self._square_changed(r, c)
+        return True
+
+    def _square_changed(self, r: int, c: int):
+        self._dirty_squares.add((r, c))
+        self._update_line(r, True)
+        self._update_line(c, False)
+
+    def _update_line(self, line_num: int, is_row: bool):
+        clues = self._row_clues[line_num] if is_row else self._col_clues[line_num]
+        length = self._puzzle.cols if is_row else self._puzzle.rows
+        known, filled = self._puzzle.get_line_masks(line_num, is_row)
+        markers = clue_markers(clues, length, known, filled)
+        all_markers = self._row_markers if is_row else self._col_markers
+        if markers != all_markers[line_num]:
+            all_markers[line_num] = markers
+            self._dirty_clues.add((line_num, is_row))
+        done = self._row_done if is_row else self._col_done
+        is_done = Puzzle.generate_clues_for_mask(filled, length) == clues
+        if is_done != done[line_num]:
+            done[line_num] = is_done
+            self._num_done += 1 if is_done else -1
+
+    def is_complete(self) -> bool:
+        return self._num_done == self._puzzle.rows + self._puzzle.cols
+
+    # Returns the clues of a line, zero clues left out.
+    def get_clues(self, line_num: int, is_row: bool) -> List[int]:
+        return self._row_clues[line_num] if is_row else self._col_clues[line_num]
+
+    def get_markers(self, line_num: int, is_row: bool) -> List[int]:
+        return self._row_markers[line_num] if is_row else self._col_markers[line_num]
+
+    # Returns the squares (r, c) and lines (line_num, is_row) whose clue markers changed since
+    # the last call, and starts collecting again.
+    def take_dirty(self) -> Tuple[Set[Tuple[int, int]], Set[Tuple[int, bool]]]:
+        dirty = self._dirty_squares, self._dirty_clues
+        self._dirty_squares = set()
+        self._dirty_clues = set()
+        return dirty
+
+
+# Pygame window for a PlayState. The whole board is drawn once; after that each frame only
+# redraws the squares and clue labels that changed, and only those rectangles are pushed to
+# the display. Left click toggles filled, right click toggles a blank mark.
+class PygameView(object):
+
+    def __init__(self, state: PlayState, cell_size: int = CELL_SIZE):
+        if pygame is None:
+            raise ImportError("PygameView needs pygame, which is not installed")
+        self._state = state
+        self._puzzle = state.get_puzzle()
+        self._cell = cell_size
+        pygame.init()
+        self._font = pygame.font.SysFont(None, max(10, cell_size - 4))
+        self._labels = {}  # (text, marker) -> rendered Surface
+        max_row_clues = max((len(state.get_clues(r, True)) for r in range(self._puzzle.rows)), default=0)
+        max_col_clues = max((len(state.get_clues(c, False)) for c in range(self._puzzle.cols)), default=0)
+        # the clue label of a line is a strip of one cell per clue, right (or bottom) aligned
+        self._left = max(1, max_row_clues) * cell_size
+        self._top = max(1, max_col_clues) * cell_size
+        self._screen = pygame.display.set_mode((self._left + self._puzzle.cols * cell_size + 1,
+                                                self._top + self._puzzle.rows * cell_size + 1))
+        pygame.display.set_caption("Nonogram")
+
+    def _label(self, text: str, marker: int):
+        label = self._labels.get((text, marker))
+        if label is None:
+            label = self._font.render(text, True, CLUE_COLORS[marker])
+            self._labels[(text, marker)] = label
+        return label
+
+    def _square_rect(self, r: int, c: int):
+        return pygame.Rect(self._left + c * self._cell, self._top + r * self._cell, self._cell + 1, self._cell + 1)
+
+    def _draw_square(self, r: int, c: int):
+        rect = self._square_rect(r, c)
+        inner = rect.inflate(-2, -2)
+        if self._puzzle.is_filled(r, c):
+            self._screen.fill(COLOR_FILLED, inner)
+        elif self._puzzle.is_blank(r, c):
+            self._screen.fill(COLOR_BACKGROUND, inner)
+            pygame.draw.line(self._screen, COLOR_BLANK_MARK, inner.topleft, inner.bottomright)
+            pygame.draw.line(self._screen, COLOR_BLANK_MARK, inner.bottomleft, inner.topright)
+        else:
+            self._screen.fill(COLOR_UNKNOWN, inner)
+        pygame.draw.rect(self._screen, COLOR_GRID, rect, 1)
+        # darker lines between sections
+        if c % SQUARES_PER_SECTION == 0:
+            pygame.draw.line(self._screen, COLOR_SECTION, rect.topleft, rect.bottomleft)
+        if r % SQUARES_PER_SECTION == 0:
+            pygame.draw.line(self._screen, COLOR_SECTION, rect.topleft, rect.topright)
+        return rect
+
+    def _clue_rect(self, line_num: int, is_row: bool):
+        if is_row:
+            return pygame.Rect(0, self._top + line_num * self._cell, self._left, self._cell)
+        return pygame.Rect(self._left + line_num * self._cell, 0, self._cell, self._top)
+
+    def _draw_clues(self, line_num: int, is_row: bool):
+        rect = self._clue_rect(line_num, is_row)
+        self._screen.fill(COLOR_BACKGROUND, rect)
+        clues = self._state.get_clues(line_num, is_row)
+        markers = self._state.get_markers(line_num, is_row)
+        for i in range(len(clues)):
+            offset = (len(clues) - i) * self._cell  # from the end next to the grid
+            cell = pygame.Rect(rect.right - offset, rect.top, self._cell, self._cell) if is_row \
+                else pygame.Rect(rect.left, rect.bottom - offset, self._cell, self._cell)
+            label = self._label(str(clues[i]), markers[i])
+            self._screen.blit(label, label.get_rect(center=cell.center))
+        return rect
+
+    def draw_all(self):
+        self._screen.fill(COLOR_BACKGROUND)
+        for r in range(self._puzzle.rows):
+            self._draw_clues(r, True)
+            for c in range(self._puzzle.cols):
+                self._draw_square(r, c)
+        for c in range(self._puzzle.cols):
+            self._draw_clues(c, False)
+        pygame.display.flip()
+
+    # Redraws what changed since the last frame and returns the rectangles it touched.
+    def draw_dirty(self) -> list:
+        squares, clues = self._state.take_dirty()
+        rects = [self._draw_square(r, c) for r, c in squares]
+        rects += [self._draw_clues(line_num, is_row) for line_num, is_row in clues]
+        if rects:
+            pygame.display.update(rects)
+        return rects
+
+    # Returns the square under a window position, or None.
+    def square_at(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        if x < self._left or y < self._top:
+            return None
+        r = (y - self._top) // self._cell
+        c = (x - self._left) // self._cell
+        return (r, c) if r < self._puzzle.rows and c < self._puzzle.cols else None
+
+    def run(self):
+        self.draw_all()
+        self._state.take_dirty()
+        clock = pygame.time.Clock()
+        is_running = True
+        while is_running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    is_running = False
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button in (1, 3):
+                    square = self.square_at(*event.pos)
+                    if square is not None:
+                        if event.button == 1:
+                            self._state.fill(*square)
+                        else:
+                            self._state.blank(*square)
+                        if self._state.is_complete():
+                            pygame.display.set_caption("Nonogram - solved!")
+            self.draw_dirty()
+            clock.tick(FRAMES_PER_SECOND)
+        pygame.quit()
+
+
+# Plays in the terminal, for when pygame isn't installed. Reads moves like "f 3 4" (toggle
+# filled at row 3, col 4) or "b 3 4" (toggle blank) and prints only the rows that changed, and
+# the clues whose markers changed (+ satisfied, ! violated).
+def play_text(state: PlayState, in_file=sys.stdin, out_file=sys.stdout):
+    puzzle = state.get_puzzle()
+    renderer = puzzle.get_renderer()
+    out_file.write(str(puzzle))
+    state.take_dirty()  # the whole board was just written
+    for line in in_file:
+        parts = line.split()
+        if not parts or parts[0] == "q":
+            break
+        if len(parts) != 3 or parts[0] not in ("f", "b") or not parts[1].isdigit() or not parts[2].isdigit():
+            out_file.write("Moves are 'f <row> <col>', 'b <row> <col>' or 'q'\n")
+            continue
+        r, c = int(parts[1]), int(parts[2])
+        if not (state.fill(r, c) if parts[0] == "f" else state.blank(r, c)):
+            out_file.write("No square at %d, %d\n" % (r, c))
+            continue
+        clues = state.take_dirty()[1]
+        for changed_r in puzzle.render_changed_rows():
+            out_file.write("%3d %s" % (changed_r, renderer.get_row_text(changed_r)))
+        for line_num, is_row in sorted(clues):
+            labels = ["%d%s" % (clue, TEXT_MARKERS[marker]) for clue, marker
+                      in zip(state.get_clues(line_num, is_row), state.get_markers(line_num, is_row))]
+            out_file.write("%s %d: %s\n" % ("row" if is_row else "col", line_num, " ".join(labels)))
+        if state.is_complete():
+            out_file.write("Solved!\n")
+            break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a puzzle.")
+    parser.add_argument("name", nargs="?", default="5by5")
+    parser.add_argument("--lib", default="lib", help="directory holding the clue files")
+    parser.add_argument("--text", action="store_true", help="play in the terminal instead of a window")
+    parser.add_argument("--cell-size", type=int, default=CELL_SIZE, help="size of a square in pixels")
+    args = parser.parse_args()
+    puzzle = Puzzle.from_directory(args.name, args.lib)
+    state = PlayState(puzzle)
+    if args.text or pygame is None:
+        if not args.text:
+            print("pygame is not installed, playing in the terminal")
+        play_text(state)
+    else:
+        PygameView(state, args.cell_size).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import heapq
+from typing import Callable, List, Optional, Tuple
+
+from puzzle import Puzzle
+
+# A line score decides the order lines are solved in: the line with the highest score is
+# popped first. It is called with the puzzle, the line, and the number of squares in the line
+# that were settled by crossing lines since it was queued. A score that depends on that number
+# is marked with @uses_num_changed, so Propagator recomputes it as the line's squares change.
+LineScore = Callable[[Puzzle, int, bool, int], int]
+
+
+def uses_num_changed(score: LineScore) -> LineScore:
+    score.uses_num_changed = True
+    return score
+
+
+# Returns the maximum overlap of the largest chunk in a line if it were placed as far left
+# and as far right as the unknown squares allow. Lines with more overlap settle more squares.
+def score_max_overlap(puzzle: Puzzle, line_num: int, is_row: bool, num_changed: int) -> int:
+    info = puzzle.get_line_info(line_num, is_row)
+    return info.max_block - puzzle.get_num_unknown_squares_in_line(line_num, is_row) + info.total + info.count - 1
+
+
+# Returns the negated number of unknown squares that must end up blank. Lines with less
+# slack are more constrained.
+def score_slack(puzzle: Puzzle, line_num: int, is_row: bool, num_changed: int) -> int:
+    num_to_fill = puzzle.get_line_info(line_num, is_row).total - puzzle.num_filled_squares_in_line(line_num, is_row)
+    return num_to_fill - puzzle.get_num_unknown_squares_in_line(line_num, is_row)
+
+
+# Returns the number of squares newly settled in the line, so the lines with the newest
+# information are solved first.
+@uses_num_changed
+def score_newly_known(puzzle: Puzzle, line_num: int, is_row: bool, num_changed: int) -> int:
+    return num_changed
+
+
+# Change-driven queue of lines to solve. When squares in a row are settled, only the columns
+# crossing them are queued, and vice versa. A line is in the queue at most once; lines are
+# popped from a heap in descending order of their score.
+# if rescore: a queued line's score is recomputed whenever one of its squares changes.
+# Otherwise the score is only computed when the line is first queued, unless the score
+# uses_num_changed.
+class Propagator(object):
+
+    def __init__(self, puzzle: Puzzle, score: LineScore = score_max_overlap, rescore: bool = False):
+        self._puzzle = puzzle
+        self._score = score
+        self._rescore = rescore or getattr(score, "uses_num_changed", False)
+        # heap entries are (-score, order queued, is_row, line_num)
+        self._heap = []
+        self._queued = set()  # (is_row, line_num) of every line in the queue
+        # for lines in the queue: (number of squares changed, round, order of the current heap entry)
+        self._pending = {}
+        self._order = 0
+        self._num_line_solves = 0
+        self._num_rounds = 0
+
+    # Queue every row and column, eg. at the start of a solve.
+    def push_all(self):
+        for i in range(max(self._puzzle.rows, self._puzzle.cols)):
+            if self._puzzle.is_valid_row(i):
+                self.push(i, True)
+            if self._puzzle.is_valid_col(i):
+                self.push(i, False)
+
+    # Queue a line to be solved in the given round, unless it is already in the queue.
+    def push(self, line_num: int, is_row: bool, round_num: int = 0, num_changed: int = 0):
+        key = (is_row, line_num)
+        if key in self._queued:
+            changed, queued_round, order = self._pending[key]
+            changed += num_changed
+            if self._rescore:
+                order = self._push_entry(line_num, is_row, changed)
+            self._pending[key] = (changed, queued_round, order)
+        else:
+            self._queued.add(key)
+            self._pending[key] = (num_changed, round_num, self._push_entry(line_num, is_row, num_changed))
+
+    def _push_entry(self, line_num: int, is_row: bool, num_changed: int) -> int:
+        self._order += 1
+        score = self._score(self._puzzle, line_num, is_row, num_changed)
+        heapq.heappush(self._heap, (-score, self._order, is_row, line_num))
+        return self._order
+
+    # Pops the highest scoring line as (line_num, is_row, round), or None if the queue is empty.
+    def pop(self) -> Optional[Tuple[int, bool, int]]:
+        while self._heap:
+            neg_score, order, is_row, line_num = heapq.heappop(self._heap)
+            key = (is_row, line_num)
+            if key in self._queued and self._pending[key][2] == order:  # skip outdated entries
+                round_num = self._pending.pop(key)[1]
+                self._queued.remove(key)
+                return line_num, is_row, round_num
+        return None
+
+    # Counts a line popped in the given round as solved. Popped lines that the caller decides
+    # not to solve aren't counted.
+    def line_solved(self, round_num: int):
+        self._num_line_solves += 1
+        self._num_rounds = max(self._num_rounds, round_num + 1)
+
+    # Queue the lines crossing the squares that were just settled in a line.
+    def line_changed(self, is_row: bool, indices: List[int], round_num: int):
+        for i in indices:
+            self.push(i, not is_row, round_num + 1, 1)
+
+    # Returns the queue and counters, for Solver checkpoints: the queued lines as (line_num,
+    # is_row, round, number of squares changed) in the order they were queued, then the number
+    # of lines solved and of rounds.
+    def get_state(self) -> Tuple[List[Tuple[int, bool, int, int]], int, int]:
+        pending = sorted(self._pending.items(), key=lambda item: item[1][2])
+        queued = [(line_num, is_row, round_num, changed)
+                  for (is_row, line_num), (changed, round_num, order) in pending]
+        return queued, self._num_line_solves, self._num_rounds
+
+    # Replaces the queue and counters with ones from get_state(). Scores are recomputed, since
+    # the lines are queued again.
+    def set_state(self, state: Tuple[List[Tuple[int, bool, int, int]], int, int]):
+        queued, num_line_solves, num_rounds = state
+        self.clear()
+        for line_num, is_row, round_num, changed in queued:
+            self.push(line_num, is_row, round_num, changed)
+        self._num_line_solves = num_line_solves
+        self._num_rounds = num_rounds
+
+    # Drops every queued line, eg. after a contradiction.
+    def clear(self):
+        self._heap.clear()
+        self._queued.clear()
+        self._pending.clear()
+
+    def is_empty(self) -> bool:
+        return len(self._queued) == 0
+
+    def get_num_line_solves(self) -> int:
+        return self._num_line_solves
+
+    # Number of rounds of propagation, where round 0 is the initial queue and lines queued
+    # because of a change in round n belong to round n + 1.
+    def get_num_rounds(self) -> int:
+        return self._num_rounds
+
+    # Number of line solves saved compared to sweeping every row and column each round.
+    def get_num_skipped(self) -> int:
+        return self._num_rounds * (self._puzzle.rows + self._puzzle.cols) - self._num_line_solves
@@ -1,88 +1,172 @@
-import collections
-import math
+import os
+import time
 from typing import *
 
-from square import Square
+from instrumentation import PHASE_IO, PHASE_RENDER, PHASE_SOLVED_CHECK, Instrumentation
+from render import BoardLayout, BoardRenderer, OutputWriter
+from square import Square, State
 
-SQUARES_PER_SECTION = 5
-VERTICAL_DIVIDER = "|"
-HORIZONTAL_DIVIDER = "-"
+OUT_DIR = "out"
+# A puzzle named <name> is stored in a directory as <name>RowClues.txt and <name>ColClues.txt
+ROW_CLUES_SUFFIX = "RowClues.txt"
+COL_CLUES_SUFFIX = "ColClues.txt"
+
+
+# What a line's clues say about it, independent of its squares. Worked out once per line when
+# a puzzle is loaded.
+# clues: the clues without zeros. min_span: squares the blocks need with one blank between
+# each (0 without clues). slack: how far the blocks can shift, the line length - min_span.
+class LineInfo(NamedTuple):
+    clues: Tuple[int, ...]
+    total: int
+    count: int
+    min_span: int
+    slack: int
+    max_block: int
+
+    @classmethod
+    def from_clues(cls, clues: List[int], length: int) -> "LineInfo":
+        clues = tuple(clue for clue in clues if clue > 0)
+        total = sum(clues)
+        min_span = total + len(clues) - 1 if clues else 0
+        return cls(clues, total, len(clues), min_span, length - min_span, max(clues, default=0))
 
 
 class Puzzle(object):
 
     def __init__(self, name: str, row_clues_path: str, col_clues_path: str):
-        self._row_clues = self._get_clues_from_file(row_clues_path)
-        self._col_clues = self._get_clues_from_file(col_clues_path)
+        self._init(name, self.read_clues_file(row_clues_path), self.read_clues_file(col_clues_path))
+
+    # Creates the puzzle named name from its clue files in a directory (see clue_paths()).
+    @classmethod
+    def from_directory(cls, name: str, directory: str) -> "Puzzle":
+        return cls(name, *cls.clue_paths(directory, name))
+
+    # Returns the paths of the row and col clue files of the puzzle named name in a directory.
+    # Ex:
+    # directory = "lib", name = "5by5"
+    # return: "lib/5by5RowClues.txt", "lib/5by5ColClues.txt"
+    @staticmethod
+    def clue_paths(directory: str, name: str) -> Tuple[str, str]:
+        return os.path.join(directory, name + ROW_CLUES_SUFFIX), os.path.join(directory, name + COL_CLUES_SUFFIX)
+
+    # Creates a puzzle from lists of clues instead of clue files.
+    @classmethod
+    def from_clues(cls, name: str, row_clues: List[List[int]], col_clues: List[List[int]]) -> "Puzzle":
+        puzzle = cls.__new__(cls)
+        puzzle._init(name, [line.copy() for line in row_clues], [line.copy() for line in col_clues])
+        return puzzle
+
+    def _init(self, name: str, row_clues: List[List[int]], col_clues: List[List[int]]):
+        self._row_clues = row_clues
+        self._col_clues = col_clues
         self.rows = len(self._row_clues)
         self.cols = len(self._col_clues)
-        self._grid = [[Square() for r in range(self.cols)] for r in range(self.rows)]
-        self._outF = open("out\\" + str(name) + ".txt", "a")
+        self._row_info = [LineInfo.from_clues(clues, self.cols) for clues in self._row_clues]
+        self._col_info = [LineInfo.from_clues(clues, self.rows) for clues in self._col_clues]
+        # The grid is stored as bitmasks, once per row and once per column. Bit c of
+        # _row_known[r] is set if square (r, c) is filled or blank, and bit c of _row_filled[r]
+        # is set if it is filled. _col_known and _col_filled hold the same bits transposed
+        # (bit r of _col_known[c]) and are kept in sync on every change.
+        self._row_known = [0] * self.rows
+        self._row_filled = [0] * self.rows
+        self._col_known = [0] * self.cols
+        self._col_filled = [0] * self.cols
+        # Solved state is tracked incrementally. _row_unknown[r] is the number of unknown squares
+        # in row r, and _row_verified[r] is True if row r is complete and matches its clues.
+        # A line is only checked against its clues when its last unknown square is settled.
+        self._row_unknown = [self.cols] * self.rows
+        self._col_unknown = [self.rows] * self.cols
+        self._row_verified = [False] * self.rows
+        self._col_verified = [False] * self.cols
+        self._num_verified = 0
+        # The output file is only opened once something is written to it
+        self._out = OutputWriter(os.path.join(OUT_DIR, str(name) + ".txt"))
+        self._renderer = None
+        self._instrumentation = None
+
+    # Records time spent checking lines, rendering and writing output. None to stop.
+    def set_instrumentation(self, instrumentation: Optional[Instrumentation]):
+        self._instrumentation = instrumentation
 
     # Returns a list of lists, where clues[] holds one line of clues, 
     # and clues[][] holds the individual clue
-    def _get_clues_from_file(self, clues_path: str):
+    @staticmethod
+    def read_clues_file(clues_path: str) -> List[List[int]]:
         clues = []
-        lines = open(clues_path, 'r').readlines()
-        for line in lines:
-            num_strs = line.split()
-            num_ints = [int(i) for i in num_strs]
-            clues.append(num_ints)
+        with open(clues_path, 'r') as f:
+            for line in f:
+                num_strs = line.split()
+                num_ints = [int(i) for i in num_strs]
+                clues.append(num_ints)
         return clues
             
     # True if the configuration of the line generates the correct clues. Note that while
     # one individual line may return that it's correct, it may not be "correct" in the
     # entire context of the puzzle.
     def is_line_correct(self, line_num: int, is_row: bool) -> bool:
-        clues = self._row_clues if is_row else self._col_clues
-        line = self.get_line(line_num, is_row)
+        info = self._row_info[line_num] if is_row else self._col_info[line_num]
+        known, filled = self.get_line_masks(line_num, is_row)
+        length = self.cols if is_row else self.rows
         return self._are_all_squares_known(line_num, is_row) \
-            and collections.Counter(clues[line_num]) == collections.Counter(self.generate_clues_for_line(line))
+            and info.clues == tuple(self.generate_clues_for_mask(filled, length))
 
     # True if all square in the line are either filled or blank
     def _are_all_squares_known(self, line_num: int, is_row: bool) -> bool:
-        line = self.get_line(line_num, is_row)
-        all_known = True
-        i = 0
-        while all_known and i < len(line):
-            all_known = not line[i].is_unknown()
-            i += 1
-        return all_known
+        known = self._row_known[line_num] if is_row else self._col_known[line_num]
+        return known == (1 << (self.cols if is_row else self.rows)) - 1
 
     # True if entire grid is filled out correctly, aka puzzle is complete.
     def is_solved(self) -> bool:
-        is_correct = True
-        r = 0
-        while is_correct and r < self.rows:
-            is_correct = self.is_line_correct(r, True)
-            r += 1
-        c = 0
-        while is_correct and c < self.cols:
-            is_correct = self.is_line_correct(c, False)
-            c += 1
-        return is_correct
+        return self._num_verified == self.rows + self.cols
 
     # Returns a copy of the requested line in the grid, not a reference to it.
     def get_line(self, line_num: int, is_row: bool) -> List[Square]:
+        known, filled = self.get_line_masks(line_num, is_row)
         line = [Square() for i in range(self.cols if is_row else self.rows)]
         for i in range(len(line)):
-            line[i] = self._grid[line_num if is_row else i][i if is_row else line_num].clone()
+            if filled >> i & 1:
+                line[i].set_filled()
+            elif known >> i & 1:
+                line[i].set_blank()
         return line
 
+    # Returns the (known, filled) bitmasks of the requested line, where bit i is square i.
+    # Used by the solver instead of get_line() since it doesn't allocate any squares.
+    def get_line_masks(self, line_num: int, is_row: bool) -> Tuple[int, int]:
+        if is_row:
+            return self._row_known[line_num], self._row_filled[line_num]
+        return self._col_known[line_num], self._col_filled[line_num]
+
+    # Returns a copy of the state of the grid, which can be passed to restore() to undo every
+    # change made since. Copies O(rows + cols) integers, not the squares themselves.
+    def snapshot(self) -> tuple:
+        return (self._row_known.copy(), self._row_filled.copy(), self._col_known.copy(), self._col_filled.copy(),
+                self._row_unknown.copy(), self._col_unknown.copy(), self._row_verified.copy(),
+                self._col_verified.copy(), self._num_verified)
+
+    # Sets the grid back to the state it was in when snapshot() was called. A snapshot can be
+    # restored any number of times.
+    def restore(self, snapshot: tuple):
+        self._row_known, self._row_filled, self._col_known, self._col_filled, \
+            self._row_unknown, self._col_unknown, self._row_verified, self._col_verified = \
+            [line.copy() for line in snapshot[:-1]]
+        self._num_verified = snapshot[-1]
+
     # Used for manual game play mode.
     def manual_fill(self, r: int, c: int) -> bool:
         is_valid = self._is_valid_square(r, c)
         if is_valid:
             # Switch between filled and unknown
-            self._grid[r][c].set_unknown() if self._grid[r][c].is_filled() else self._grid[r][c].set_filled()
+            self._set_unknown(r, c) if self.is_filled(r, c) else self.set_filled(r, c)
         return is_valid
 
     # Used for manual game play mode.
     def manual_blank(self, r: int, c: int) -> bool:
         is_valid = self._is_valid_square(r, c)
         if is_valid:
-            # Switch between filled and unknown
-            self._grid[r][c].set_unknown() if self._grid[r][c].is_blank() else self._grid[r][c].set_blank()
+            # Switch between blank and unknown
+            self._set_unknown(r, c) if self.is_blank(r, c) else self.set_blank(r, c)
         return is_valid
 
     def _is_valid_square(self, r: int, c: int) -> bool:
@@ -95,114 +179,55 @@ class Puzzle(object):
         return 0 <= c < self.cols
 
     def __str__(self) -> str:
-        out = ""
-        max_num_row_clues = self._max_num_clues(self._row_clues)
-        max_digits_in_row_clues = self._max_digits(self._row_clues) + 1
-        print(max_digits_in_row_clues)
-        row_clue_space = max_num_row_clues * max_digits_in_row_clues
-        # Add all of the column clue labels
-        max_num_col_clues = self._max_num_clues(self._col_clues)
-        col_clue_space = self._max_digits(self._col_clues) + 1
-        ccs = "%" + str(col_clue_space) + "s"
-        grid_cols_spaced = (self.rows // SQUARES_PER_SECTION + self.rows + 1) * col_clue_space
-        for r in range(max_num_col_clues):  # iterate through the rows of col clues
-            out += " " * row_clue_space  # blank space to accommodate row clues
-            for c in range(self.cols):  # iterate through each col to get the clue
-                clue_val = self._clue_val(c, r, max_num_col_clues, self._col_clues)
-                if c % SQUARES_PER_SECTION == 0:
-                    out += ccs % VERTICAL_DIVIDER
-                out += ccs % (" " if clue_val == 0 else str(clue_val))  # lower justify
-            out += ccs % VERTICAL_DIVIDER + "\n"
-        # Now onto the row clues and the grid
-        hor_div_line = HORIZONTAL_DIVIDER * (row_clue_space + grid_cols_spaced + 1) + "\n"
-        for r in range(self.rows):  # iterate through the rows in the puzzle
-            if r % SQUARES_PER_SECTION == 0:  # Add horizontal divider if we're at the end of a section
-                out += hor_div_line
-            # Add the row clues
-            for i in range(max_num_row_clues):  # iterate through each row clue
-                clue_val = self._clue_val(r, i, max_num_row_clues, self._row_clues)
-                rcs = "%" + str(max_digits_in_row_clues) + "s"
-                out += rcs % (" " if clue_val == 0 else clue_val)  # lower justify
-            # Add values from grid
-            for c in range(self.cols):
-                if c % SQUARES_PER_SECTION == 0:  # Add vertical dividing line if at end of section
-                    out += ccs % VERTICAL_DIVIDER
-                out += ccs % self._grid[r][c].__str__()
-            # Add end vertical line
-            out += ccs % VERTICAL_DIVIDER + "\n"
-        # Add bottom horizontal line
-        out += hor_div_line
-        return out
+        if self._instrumentation is not None:
+            with self._instrumentation.phase(PHASE_RENDER):
+                return self._render()
+        return self._render()
+
+    def _render(self) -> str:
+        return self.get_renderer().render(self._row_known, self._row_filled)
+
+    # Returns the renderer __str__() uses. Its layout is worked out the first time it's asked
+    # for, and it only re-renders rows that changed since it last rendered.
+    def get_renderer(self) -> BoardRenderer:
+        if self._renderer is None:
+            self._renderer = BoardRenderer(BoardLayout(self._row_clues, self._col_clues))
+        return self._renderer
+
+    # Re-renders only the rows that changed since the board was last rendered, and returns their
+    # indices. Their text is then available from get_renderer().get_row_text().
+    def render_changed_rows(self) -> List[int]:
+        return self.get_renderer().update(self._row_known, self._row_filled)
 
     # Return the largest value clue in a given line. Eg: If clue is [1 3 2], will return 3
     def max_clue_val_in_line(self, line_num: int, is_row: bool) -> int:
-        clues = self._row_clues[line_num] if is_row else self._col_clues[line_num]
-        max_val = int("-inf")
-        for i in range(len(clues)):
-            if clues[i] > max_val:
-                max_val = clues[i]
-        return max_val
+        return self.get_line_info(line_num, is_row).max_block
 
     # Returns copy of clues for line, not a reference to it.
     def get_clues(self, line_num: int, is_row: bool) -> List[int]:
         return self._row_clues[line_num].copy() if is_row else self._col_clues[line_num].copy()
 
+    # Returns the line's precomputed clue metadata. Cheaper than get_clues() in hot paths since
+    # nothing is copied.
+    def get_line_info(self, line_num: int, is_row: bool) -> LineInfo:
+        return self._row_info[line_num] if is_row else self._col_info[line_num]
+
     # Used for determining the max initial overlap in a line, which is used for the priority solver
     def get_num_unknown_squares_in_line(self, line_num: int, is_row: bool) -> int:
-        num_unknown_squares = 0
-        line = self.get_line(line_num, is_row)
-        for i in range(len(line)):
-            if line[i].is_unknown():
-                num_unknown_squares += 1
-        return num_unknown_squares
+        return self._row_unknown[line_num] if is_row else self._col_unknown[line_num]
+
+    # Returns the number of squares in the grid that are filled or blank.
+    def get_num_known_squares(self) -> int:
+        return self.rows * self.cols - sum(self._row_unknown)
 
     # Returns sum of clue values in line. Used for determining max overlap in line for priority solver
     def sum_clues_in_line(self, line_num: int, is_row: bool) -> int:
-        clues = self.get_clues(line_num, is_row)
-        sum_clues = 0
-        for i in range(len(clues)):
-            sum_clues += clues[i]
-        return sum_clues
+        return self.get_line_info(line_num, is_row).total
 
     # Returns number of filled squares in line. Used for priority solver.
     def num_filled_squares_in_line(self, line_num: int, is_row: bool) -> int:
-        num_filled_squares = 0
-        for i in range(self.cols if is_row else self.rows):
-            if self.is_filled(line_num if is_row else i, i if is_row else line_num):
-                num_filled_squares += 1
-        return num_filled_squares
-
-    # Used in __str__() to ensure that the clues are all aligned to the bottom.
-    @staticmethod
-    def _clue_val(num_clue: int, num_chunk: int, max_num_clues: int, clues) -> int:  # type = clues: List[int][int]
-        val = 0
-        offset = max_num_clues - len(clues[num_clue])
-        if num_chunk >= offset:
-            val = clues[num_clue][num_chunk - offset]
-        return val
-
-    # Returns the greatest number of clues in either the row clues or col clues, depending
-    # on which is passed. Used for __str__() formatting.
-    @staticmethod
-    def _max_num_clues(clues) -> int:  # type = clues: List[int][int]
-        max_num_clues = 0
-        for i in range(len(clues)):
-            num_clues = len(clues[i])
-            if num_clues > max_num_clues:
-                max_num_clues = num_clues
-        return max_num_clues
-
-    # Returns the max number of digits in either any row clue or any col clue.
-    # Used for __str__() formatting
-    @staticmethod
-    def _max_digits(clues) -> int:  # type = clues: Line[int][int]
-        max_digits = 0
-        for i in range(len(clues)):
-            for j in range(len(clues[i])):
-                num_digits = int(math.log10(clues[i][j]))+1
-                if num_digits > max_digits:
-                    max_digits = num_digits
-        return max_digits
+        filled = self._row_filled[line_num] if is_row else self._col_filled[line_num]
+        return filled.bit_count()
 
     # Given a list of squares (a line), generate the clues for it. Used for
     # determining if possible line configuration would be correct.
@@ -232,30 +257,118 @@ class Puzzle(object):
             clues.append(len_chunk)
         return clues
 
+    # Same as generate_clues_for_line(), but for a line given as a bitmask of its filled
+    # squares, where bit i is square i.
+    # Ex:
+    # filled = 0b1111100111, length = 10 (O O O . . O O O O O)
+    # return: clues = [3, 5]
+    @staticmethod
+    def generate_clues_for_mask(filled: int, length: int) -> List[int]:
+        clues = []
+        while filled:
+            # skip to the next filled square, then measure the run of filled squares
+            gap = (filled & -filled).bit_length() - 1
+            filled >>= gap
+            len_chunk = (~filled & (filled + 1)).bit_length() - 1
+            clues.append(len_chunk)
+            filled >>= len_chunk
+        return clues
+
     def is_unknown(self, r: int, c: int) -> bool:
-        return self._is_valid_square(r, c) and self._grid[r][c].is_unknown()
+        return self._is_valid_square(r, c) and not self._row_known[r] >> c & 1
 
     def is_filled(self, r: int, c: int) -> bool:
-        return self._is_valid_square(r, c) and self._grid[r][c].is_filled()
+        return self._is_valid_square(r, c) and self._row_filled[r] >> c & 1 == 1
 
     def is_blank(self, r: int, c: int) -> bool:
-        return self._is_valid_square(r, c) and self._grid[r][c].is_blank()
+        return self._is_valid_square(r, c) and self._row_known[r] >> c & 1 == 1 and not self._row_filled[r] >> c & 1
+
+    def get_state(self, r: int, c: int) -> State:
+        if self._row_filled[r] >> c & 1:
+            return State.filled
+        return State.blank if self._row_known[r] >> c & 1 else State.unknown
+
+    # Returns each row of the grid as a string of State symbols, eg. "OO. ." (" " is unknown).
+    def get_grid_rows(self) -> List[str]:
+        symbols = {state: state.value[0] for state in State}
+        return ["".join(symbols[self.get_state(r, c)] for c in range(self.cols)) for r in range(self.rows)]
 
     def set_filled(self, r: int, c: int):
-        if self._is_valid_square(r, c):
-            self._grid[r][c].set_filled()
+        if self._is_valid_square(r, c) and not self._row_filled[r] >> c & 1:
+            was_known = self._row_known[r] >> c & 1
+            self._row_known[r] |= 1 << c
+            self._row_filled[r] |= 1 << c
+            self._col_known[c] |= 1 << r
+            self._col_filled[c] |= 1 << r
+            self._square_settled(r, c, was_known)
 
     def set_blank(self, r: int, c: int):
-        if self._is_valid_square(r, c):
-            self._grid[r][c].set_blank()
+        if self._is_valid_square(r, c) and not self.is_blank(r, c):
+            was_known = self._row_known[r] >> c & 1
+            self._row_known[r] |= 1 << c
+            self._row_filled[r] &= ~(1 << c)
+            self._col_known[c] |= 1 << r
+            self._col_filled[c] &= ~(1 << r)
+            self._square_settled(r, c, was_known)
+
+    def _set_unknown(self, r: int, c: int):
+        if self._row_known[r] >> c & 1:
+            self._row_known[r] &= ~(1 << c)
+            self._row_filled[r] &= ~(1 << c)
+            self._col_known[c] &= ~(1 << r)
+            self._col_filled[c] &= ~(1 << r)
+            self._row_unknown[r] += 1
+            self._col_unknown[c] += 1
+            self._set_verified(r, True, False)
+            self._set_verified(c, False, False)
+
+    # Updates the unknown counts of row r and col c after square (r, c) changed to filled or
+    # blank, and re-checks any of the two lines that no longer has unknown squares.
+    def _square_settled(self, r: int, c: int, was_known: bool):
+        if not was_known:
+            self._row_unknown[r] -= 1
+            self._col_unknown[c] -= 1
+        if self._row_unknown[r] == 0 or self._col_unknown[c] == 0:
+            if self._instrumentation is not None:
+                start_ns = time.perf_counter_ns()
+            if self._row_unknown[r] == 0:
+                self._set_verified(r, True, self.is_line_correct(r, True))
+            if self._col_unknown[c] == 0:
+                self._set_verified(c, False, self.is_line_correct(c, False))
+            if self._instrumentation is not None:
+                self._instrumentation.add_phase_time(PHASE_SOLVED_CHECK, time.perf_counter_ns() - start_ns)
+
+    def _set_verified(self, line_num: int, is_row: bool, is_verified: bool):
+        verified = self._row_verified if is_row else self._col_verified
+        if verified[line_num] != is_verified:
+            verified[line_num] = is_verified
+            self._num_verified += 1 if is_verified else -1
 
     @staticmethod
     def console_print(text: str):
         print(text)
 
     def file_print(self, text: str):
-        self._outF.write(text)
+        if self._instrumentation is not None:
+            with self._instrumentation.phase(PHASE_IO):
+                self._file_write(text)
+        else:
+            self._file_write(text)
+
+    def _file_write(self, text: str):
+        self._out.write(text)
 
     def print(self, text: str):
         self.console_print(text)
-        self.file_print(text)
\ No newline at end of file
+        self.file_print(text + "\n")
+
+    # Writes out anything still buffered for the output file and closes it. Printing again
+    # reopens it.
+    def close(self):
+        self._out.close()
+
+    def __enter__(self) -> "Puzzle":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import io
+from typing import Dict, List, Optional, Tuple
+
+from square import State
+
+SQUARES_PER_SECTION = 5
+VERTICAL_DIVIDER = "|"
+HORIZONTAL_DIVIDER = "-"
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+
+# Returns the greatest number of clues in any line.
+def _max_num_clues(clues: List[List[int]]) -> int:
+    return max((len(line) for line in clues), default=0)
+
+
+# Returns the number of digits of the widest clue in any line, 0 if there are no clues.
+def _max_digits(clues: List[List[int]]) -> int:
+    return max((len(str(clue)) for line in clues for clue in line), default=0)
+
+
+# The parts of a board's text that only depend on the clues, worked out once per puzzle: the
+# col clues above the grid (bottom aligned), the row clues left of each row (right aligned),
+# the horizontal dividers, and the text of every square. Dividers come every
+# SQUARES_PER_SECTION squares.
+class BoardLayout(object):
+
+    def __init__(self, row_clues: List[List[int]], col_clues: List[List[int]]):
+        row_clues = [[clue for clue in line if clue > 0] for line in row_clues]
+        col_clues = [[clue for clue in line if clue > 0] for line in col_clues]
+        self.rows = len(row_clues)
+        self.cols = len(col_clues)
+        max_num_row_clues = _max_num_clues(row_clues)
+        row_clue_width = _max_digits(row_clues) + 1
+        row_clue_space = max_num_row_clues * row_clue_width
+        self._cell = "%" + str(_max_digits(col_clues) + 1) + "s"
+        self._divider = self._cell % VERTICAL_DIVIDER
+        # State values are 1-tuples or strings, both of which % formats as the symbol
+        self._squares = {state: self._cell % state.value for state in State}
+        # (section width, known bits, filled bits) -> text of those squares, filled in as needed
+        self._sections = {}  # type: Dict[Tuple[int, int, int], str]
+
+        header = []
+        max_num_col_clues = _max_num_clues(col_clues)
+        for i in range(max_num_col_clues):
+            parts = [" " * row_clue_space]
+            for c in range(self.cols):
+                if c % SQUARES_PER_SECTION == 0:
+                    parts.append(self._divider)
+                offset = max_num_col_clues - len(col_clues[c])
+                parts.append(self._cell % (col_clues[c][i - offset] if i >= offset else " "))
+            parts.append(self._divider + "\n")
+            header.append("".join(parts))
+        self.header = "".join(header)
+        row_clue_cell = "%" + str(row_clue_width) + "s"
+        self.row_prefixes = ["".join(row_clue_cell % clue for clue in [" "] * (max_num_row_clues - len(line)) + line)
+                             for line in row_clues]
+        num_sections = -(-self.cols // SQUARES_PER_SECTION)
+        grid_width = (self.cols + num_sections + 1) * len(self._divider)
+        self.divider_line = HORIZONTAL_DIVIDER * (row_clue_space + grid_width + 1) + "\n"
+
+    # Returns the text of one row of the grid, including its clues and the trailing newline.
+    def render_row(self, r: int, known: int, filled: int) -> str:
+        parts = [self.row_prefixes[r]]
+        for c in range(0, self.cols, SQUARES_PER_SECTION):
+            width = min(SQUARES_PER_SECTION, self.cols - c)
+            section_mask = (1 << width) - 1
+            key = (width, known >> c & section_mask, filled >> c & section_mask)
+            section = self._sections.get(key)
+            if section is None:
+                section = self._render_section(*key)
+                self._sections[key] = section
+            parts.append(section)
+        parts.append(self._divider + "\n")
+        return "".join(parts)
+
+    def _render_section(self, width: int, known: int, filled: int) -> str:
+        parts = [self._divider]
+        for i in range(width):
+            if filled >> i & 1:
+                parts.append(self._squares[State.filled])
+            elif known >> i & 1:
+                parts.append(self._squares[State.blank])
+            else:
+                parts.append(self._squares[State.unknown])
+        return "".join(parts)
+
+
+# Renders a board, re-rendering only the rows that changed since the previous call. The row
+# masks are the ones Puzzle keeps: bit c of known[r] is set if square (r, c) is settled, and bit
+# c of filled[r] if it's filled.
+class BoardRenderer(object):
+
+    def __init__(self, layout: BoardLayout):
+        self._layout = layout
+        self._known = [None] * layout.rows  # type: List[Optional[int]]
+        self._filled = [None] * layout.rows  # type: List[Optional[int]]
+        self._row_text = [""] * layout.rows
+
+    def get_layout(self) -> BoardLayout:
+        return self._layout
+
+    # Re-renders the rows whose squares differ from the last update. Returns their indices.
+    def update(self, known: List[int], filled: List[int]) -> List[int]:
+        changed = []
+        for r in range(self._layout.rows):
+            if known[r] != self._known[r] or filled[r] != self._filled[r]:
+                self._known[r] = known[r]
+                self._filled[r] = filled[r]
+                self._row_text[r] = self._layout.render_row(r, known[r], filled[r])
+                changed.append(r)
+        return changed
+
+    # Returns the text of row r as of the last update.
+    def get_row_text(self, r: int) -> str:
+        return self._row_text[r]
+
+    # Returns the whole board.
+    def render(self, known: List[int], filled: List[int]) -> str:
+        self.update(known, filled)
+        parts = [self._layout.header]
+        for r in range(self._layout.rows):
+            if r % SQUARES_PER_SECTION == 0:
+                parts.append(self._layout.divider_line)
+            parts.append(self._row_text[r])
+        parts.append(self._layout.divider_line)
+        return "".join(parts)
+
+
+# Buffered text output to a file that's only opened once something is written, and closed
+# when the writer is. Use it in a with block, or close() it, so the buffer reaches the file.
+class OutputWriter(object):
+
+    def __init__(self, path: str, mode: str = "a", buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self._path = path
+        self._mode = mode
+        self._buffer_size = buffer_size
+        self._f = None  # type: Optional[io.TextIOBase]
+
+    def write(self, text: str):
+        if self._f is None:
+            self._f = open(self._path, self._mode, buffering=self._buffer_size)
+        self._f.write(text)
+
+    def flush(self):
+        if self._f is not None:
+            self._f.flush()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,269 @@
+import time
+from typing import List, Optional, Tuple
+
+from line_cache import LineCache
+from puzzle import Puzzle
+from checkpoint import Checkpoint
+from solver import ENGINE_DP, CancellationToken, SolveCancelled, SolveResult, SolveTimeout, Solver
+
+
+# Solver that can finish puzzles line solving alone gets stuck on, by guessing squares and
+# backtracking. When line solving stalls, every unknown square is probed: it's set filled and
+# then blank, and each trial is propagated until no line can settle more squares. If one value
+# leads to a contradiction the other is committed, and squares that end up the same after both
+# trials are committed too. If probing settles nothing, the search branches on the unknown
+# square whose row and column have the fewest unknown squares, trying filled first, with a
+# snapshot of the grid on the trail to backtrack to.
+# if probe: probe squares before branching. Fewer nodes, but each one costs more.
+class SearchSolver(Solver):
+
+    def __init__(self, puzzle: Puzzle, engine: str = ENGINE_DP, cache: Optional[LineCache] = None,
+                 probe: bool = True):
+        super().__init__(puzzle, engine, cache)
+        self._probe = probe
+        # (snapshot of the grid before the guess, r, c) for each guess whose other value is untried
+        self._trail = []
+        self._limit = 1  # number of solutions to stop at
+        self._num_solutions = 0
+        self._last_solution = None  # snapshot of the grid at the last solution found
+        self._num_nodes = 0
+        self._num_backtracks = 0
+        self._num_probes = 0
+        self._probe_start = None  # snapshot of the grid before the probe in progress
+
+    # Solves the puzzle, without printing anything. Returns False if the clues have no solution.
+    # Raises SolveTimeout if more than timeout seconds pass first.
+    # update_solve and queue_solve: the order lines are propagated in, same as for priority_solve()
+    def solve(self, timeout: Optional[float] = None, update_solve: bool = False, queue_solve: bool = False) -> bool:
+        self._set_budget(timeout)
+        return self._count_solutions(1, update_solve, queue_solve) > 0
+
+    # Counts the solutions of the puzzle, stopping once limit are found. With limit=2 this tells
+    # puzzles with a unique solution apart from ones with several. Leaves the puzzle at the last
+    # solution found. Raises SolveTimeout if more than timeout seconds pass first.
+    def count_solutions(self, limit: int = 2, timeout: Optional[float] = None) -> int:
+        self._set_budget(timeout)
+        return self._count_solutions(limit)
+
+    # Same as solve(), but stops once timeout seconds pass, max_line_solves lines are solved or
+    # token is cancelled, and returns where it got to (see Solver.anytime_solve()). When search
+    # is stopped, the grid is set back to the squares settled before the first guess, so the
+    # result only holds squares that are the same in every solution.
+    def anytime_solve(self, timeout: Optional[float] = None, max_line_solves: Optional[int] = None,
+                      token: Optional[CancellationToken] = None, update_solve: bool = False,
+                      queue_solve: bool = False) -> SolveResult:
+        return self._run_bounded(lambda: self._find_solution(update_solve, queue_solve), timeout, max_line_solves,
+                                 token)
+
+    def _find_solution(self, update_solve: bool, queue_solve: bool) -> bool:
+        try:
+            return self._count_solutions(1, update_solve, queue_solve) > 0
+        except (SolveTimeout, SolveCancelled):
+            if len(self._trail) > 0:
+                self._restore(self._trail[0][0])
+            raise
+
+    def _count_solutions(self, limit: int, update_solve: bool = False, queue_solve: bool = False) -> int:
+        self._trail = []
+        self._limit = limit
+        self._num_solutions = 0
+        self._last_solution = None
+        is_consistent = self._overlap_pass() is not None
+        self._start_propagator(update_solve, queue_solve)
+        return self._search() if is_consistent else 0
+
+    # Same as Solver.get_checkpoint(), along with the search trail and counters.
+    def get_checkpoint(self) -> Checkpoint:
+        checkpoint = super().get_checkpoint()
+        checkpoint.search = {"probe": self._probe, "limit": self._limit, "num_solutions": self._num_solutions,
+                             "last_solution": self._last_solution, "trail": list(self._trail), "nodes": self._num_nodes,
+                             "backtracks": self._num_backtracks, "probes": self._num_probes}
+        return checkpoint
+
+    def set_checkpoint(self, checkpoint: Checkpoint):
+        if checkpoint.search is None:
+            raise ValueError("The checkpoint is of a solve without search")
+        super().set_checkpoint(checkpoint)
+        search = checkpoint.search
+        self._probe = search["probe"]
+        self._limit = search["limit"]
+        self._num_solutions = search["num_solutions"]
+        self._last_solution = search["last_solution"]
+        self._trail = list(search["trail"])
+        self._num_nodes = search["nodes"]
+        self._num_backtracks = search["backtracks"]
+        self._num_probes = search["probes"]
+
+    # Carries on the search set_checkpoint() restored. Returns True if a solution was found,
+    # leaving the puzzle at it. Raises SolveTimeout if more than timeout seconds pass first, and
+    # ValueError if there's no search to carry on.
+    def resume(self, timeout: Optional[float] = None) -> bool:
+        self._check_resumable()
+        self._set_budget(timeout)
+        return self._search() > 0
+
+    # No checkpoints are written during a probe, since its trial isn't on the trail.
+    def _can_checkpoint(self) -> bool:
+        return self._probe_start is None
+
+    # Solves the puzzle and prints the result. Returns False if the clues have no solution.
+    def search_solve(self) -> bool:
+        start_time = time.perf_counter()
+        is_solved = self.solve()
+        end_time = time.perf_counter()
+        if not is_solved:
+            self._puzzle.print("Contradiction: the clues have no solution")
+        self._puzzle.print("Line solves = %d, nodes = %d, backtracks = %d, probes = %d"
+                           % (self._num_line_solves, self._num_nodes,
+                              self._num_backtracks, self._num_probes))
+        self._puzzle.file_print(self._puzzle.__str__())
+        self._puzzle.print("Time = %.4f seconds" % (end_time - start_time))
+        return is_solved
+
+    # Depth first search over guessed squares, from the current grid and trail. Returns once
+    # _limit solutions are found, or every branch has been tried, with the number of solutions
+    # found. Probing only commits squares that are the same in every solution, so no solution
+    # is lost to it.
+    def _search(self) -> int:
+        is_consistent = self._propagate()
+        while True:
+            if is_consistent and self._probe and not self._puzzle.is_solved():
+                is_consistent = self._probe_squares()
+            if is_consistent and self._puzzle.is_solved():
+                self._num_solutions += 1
+                if self._num_solutions >= self._limit:
+                    return self._num_solutions
+                self._last_solution = self._puzzle.snapshot()
+                is_consistent = False  # backtrack to look for the next solution
+            if is_consistent:
+                r, c = self._choose_square()
+                self._trail.append((self._puzzle.snapshot(), r, c))
+                self._num_nodes += 1
+                is_consistent = self._settle_and_propagate(r, c, True)
+            else:
+                if len(self._trail) == 0:
+                    if self._last_solution is not None:
+                        self._restore(self._last_solution)
+                    return self._num_solutions
+                # filled led to a contradiction or an already counted solution, so try blank
+                snapshot, r, c = self._trail.pop()
+                self._num_backtracks += 1
+                self._restore(snapshot)
+                is_consistent = self._settle_and_propagate(r, c, False)
+
+    # Probes unknown squares until a full pass settles nothing. Returns False if some square
+    # can be neither filled nor blank.
+    def _probe_squares(self) -> bool:
+        self._probe_start = None
+        try:
+            return self._probe_all()
+        except (SolveTimeout, SolveCancelled):
+            # the grid may hold a trial, so go back to before it
+            if self._probe_start is not None:
+                self._restore(self._probe_start)
+            raise
+        finally:
+            self._probe_start = None
+
+    def _probe_all(self) -> bool:
+        is_progress = True
+        while is_progress and not self._puzzle.is_solved():
+            is_progress = False
+            for r, c in self._get_unknown_squares():
+                if not self._puzzle.is_unknown(r, c):
+                    continue  # settled by an earlier probe in this pass
+                if self._checkpoint_path is not None:
+                    # resuming from here starts the pass over, with every square settled so far
+                    self._checkpoint_if_due()
+                self._num_probes += 1
+                before = self._puzzle.snapshot()
+                self._probe_start = before
+                is_filled_ok = self._settle_and_propagate(r, c, True)
+                if is_filled_ok:
+                    if_filled = self._puzzle.snapshot()
+                    filled_rows = self._get_row_masks()
+                self._restore(before)
+                is_blank_ok = self._settle_and_propagate(r, c, False)
+                if not is_filled_ok and not is_blank_ok:
+                    return False
+                if not is_filled_ok:
+                    is_progress = True  # keep the blank trial
+                elif not is_blank_ok:
+                    self._restore(if_filled)
+                    is_progress = True
+                else:
+                    blank_rows = self._get_row_masks()
+                    self._restore(before)
+                    num_settled = self._settle_common(filled_rows, blank_rows)
+                    if not self._propagate():
+                        return False
+                    is_progress = is_progress or num_settled > 0
+                self._probe_start = None
+                if self._puzzle.is_solved():
+                    return True
+        return True
+
+    # Settles every unknown square that has the same state in both lists of row masks, and
+    # returns how many there were.
+    def _settle_common(self, rows_a: List[Tuple[int, int]], rows_b: List[Tuple[int, int]]) -> int:
+        num_settled = 0
+        for r in range(self._puzzle.rows):
+            known_a, filled_a = rows_a[r]
+            known_b, filled_b = rows_b[r]
+            common = known_a & known_b & ~(filled_a ^ filled_b) & ~self._puzzle.get_line_masks(r, True)[0]
+            for c in range(self._puzzle.cols):
+                if common >> c & 1:
+                    self._settle(r, c, filled_a >> c & 1 == 1)
+                    num_settled += 1
+        return num_settled
+
+    # Sets square (r, c) and queues the row and col crossing it.
+    def _settle(self, r: int, c: int, is_filled: bool):
+        if is_filled:
+            self._puzzle.set_filled(r, c)
+        else:
+            self._puzzle.set_blank(r, c)
+        self._propagator.push(r, True)
+        self._propagator.push(c, False)
+
+    # Sets square (r, c) and propagates. Returns False on a contradiction.
+    def _settle_and_propagate(self, r: int, c: int, is_filled: bool) -> bool:
+        self._settle(r, c, is_filled)
+        return self._propagate()
+
+    def _restore(self, snapshot: tuple):
+        self._puzzle.restore(snapshot)
+        self._propagator.clear()
+        self._forget_line_states()
+
+    # Returns the unknown square in the most constrained lines: the square in the row with the
+    # fewest unknown squares, whose col has the fewest unknown squares.
+    def _choose_square(self) -> Tuple[int, int]:
+        best_r = -1
+        for r in range(self._puzzle.rows):
+            num_unknown = self._puzzle.get_num_unknown_squares_in_line(r, True)
+            if num_unknown > 0 and (best_r < 0 or num_unknown < self._puzzle.get_num_unknown_squares_in_line(best_r, True)):
+                best_r = r
+        best_c = -1
+        for c in range(self._puzzle.cols):
+            if self._puzzle.is_unknown(best_r, c) and \
+                    (best_c < 0 or self._puzzle.get_num_unknown_squares_in_line(c, False)
+                     < self._puzzle.get_num_unknown_squares_in_line(best_c, False)):
+                best_c = c
+        return best_r, best_c
+
+    def _get_unknown_squares(self) -> List[Tuple[int, int]]:
+        return [(r, c) for r in range(self._puzzle.rows) for c in range(self._puzzle.cols)
+                if self._puzzle.is_unknown(r, c)]
+
+    def _get_row_masks(self) -> List[Tuple[int, int]]:
+        return [self._puzzle.get_line_masks(r, True) for r in range(self._puzzle.rows)]
+
+    def get_num_nodes(self) -> int:
+        return self._num_nodes
+
+    def get_num_backtracks(self) -> int:
+        return self._num_backtracks
+
+    def get_num_probes(self) -> int:
+        return self._num_probes
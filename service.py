@@ -0,0 +1,554 @@
+import argparse
+import asyncio
+import concurrent.futures
+import hashlib
+import http
+import http.client
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import socket
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from atomic_file import AtomicWriter
+from puzzle import OUT_DIR, Puzzle
+from search import SearchSolver
+from solver import STATUS_CANCELLED, STATUS_CONTRADICTION, STATUS_SOLVED, STATUS_TIMEOUT, CancellationToken
+
+# Local solve service. Tools send clue sets over HTTP, on localhost or a Unix socket, instead of
+# solving them in process, so a puzzle one tool has solved is served from the cache to the next.
+#
+#   POST   /jobs              {"row_clues": [[1, 1], ...], "col_clues": [...], "timeout": 10}
+#                             -> the job. Its id is the hash of the clues, so submitting clues
+#                             that are already queued, running or solved returns that job
+#   GET    /jobs/<id>         -> the job
+#   GET    /jobs/<id>/events  -> the job as a line of JSON each time it changes, until it's final
+#   DELETE /jobs/<id>         cancels the job -> the job
+#   GET    /status            -> {"workers": ..., "active_jobs": ..., "max_jobs": ...}
+#
+# A job is {"id", "status", "rows", "cols", "num_known", "line_solves", "seconds", "grid",
+# "error"}, where grid is set once solved, one string per row of "O" (filled) and "." (blank).
+# Final statuses are the solver.STATUS_ ones a search can end with ("solved", "contradiction" for
+# clues with no solution, "timeout" and "cancelled"), or "error" if solving failed.
+# Jobs are solved by SearchSolver in a pool of worker processes. Solved puzzles, and clues with
+# no solution, are cached on disk, so they're served without solving again after a restart.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_DIR = os.path.join(OUT_DIR, "service_cache")
+DEFAULT_MAX_JOBS = 64
+DEFAULT_MAX_TIMEOUT = 600.0
+PROGRESS_INTERVAL = 0.2  # seconds between progress reports from a running job
+MAX_BODY_BYTES = 1 << 22
+
+# Job statuses besides the solver's. A job is active while queued or running, and final after that.
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_ERROR = "error"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+CACHED_STATUSES = (STATUS_SOLVED, STATUS_CONTRADICTION)  # final statuses that only depend on the clues
+
+_HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+Clues = List[List[int]]
+
+
+# Raised by SolveService.submit() when max_jobs jobs are already active.
+class ServiceBusy(Exception):
+    pass
+
+
+# Raised by ServiceClient when the service answers with an error.
+class ServiceError(Exception):
+
+    def __init__(self, status: int, message: str):
+        super().__init__("%d: %s" % (status, message))
+        self.status = status
+        self.message = message
+
+
+# Returns the hash that identifies a clue set. Zero clues are dropped first, so [0] and [] are
+# the same empty line.
+def puzzle_hash(row_clues: Clues, col_clues: Clues) -> str:
+    canonical = [[[clue for clue in line if clue > 0] for line in clues] for clues in (row_clues, col_clues)]
+    return hashlib.sha256(json.dumps(canonical, separators=(",", ":")).encode()).hexdigest()
+
+
+# Returns the clues of a request, or raises ValueError if they aren't a list of lists of
+# non-negative ints.
+def _parse_clues(value: Any, name: str) -> Clues:
+    if not isinstance(value, list) or not all(isinstance(line, list) for line in value):
+        raise ValueError(name + " must be a list of lists of clues")
+    for line in value:
+        if not all(isinstance(clue, int) and not isinstance(clue, bool) and clue >= 0 for clue in line):
+            raise ValueError(name + " must only hold non-negative ints")
+    return value
+
+
+# Final results on disk, one JSON file per puzzle hash, written with AtomicWriter.
+class ResultCache(object):
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[dict]:
+        if not _HASH_PATTERN.fullmatch(key):
+            return None
+        try:
+            with open(os.path.join(self._directory, key + ".json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, result: dict):
+        path = os.path.join(self._directory, key + ".json")
+        with AtomicWriter(path) as f:
+            json.dump(result, f)
+
+
+# Solves one job in a worker process. deadline is a time.time() value. progress and cancelled
+# are a queue and a dict shared with the service. Every PROGRESS_INTERVAL seconds the solver's
+# progress hook reports how many squares are known, and cancels the solve if the job's token
+# was put in cancelled. Returns (status, grid, line solves), with the grid as rows of State
+# symbols if solved, else None.
+def _solve_job(job_token: str, row_clues: Clues, col_clues: Clues, deadline: float, progress,
+               cancelled) -> Tuple[str, Optional[List[str]], int]:
+    timeout = deadline - time.time()
+    if timeout <= 0:
+        return STATUS_TIMEOUT, None, 0
+    puzzle = Puzzle.from_clues("service", row_clues, col_clues)
+    solver = SearchSolver(puzzle)
+    token = CancellationToken()
+
+    def report(num_known: int):
+        if job_token in cancelled:
+            token.cancel()
+        progress.put((job_token, num_known))
+
+    solver.set_progress_hook(report, PROGRESS_INTERVAL)
+    result = solver.anytime_solve(timeout, token=token)
+    return result.status, puzzle.get_grid_rows() if result.status == STATUS_SOLVED else None, result.line_solves
+
+
+# One submission of a clue set, as the service tracks it while it's active.
+class _Job(object):
+
+    def __init__(self, job_id: str, token: str, rows: int, cols: int):
+        self.id = job_id
+        self.token = token  # tells this submission apart from earlier ones of the same clues
+        self.rows = rows
+        self.cols = cols
+        self.status = STATUS_QUEUED
+        self.num_known = 0
+        self.line_solves = 0
+        self.grid = None  # type: Optional[List[str]]
+        self.error = None  # type: Optional[str]
+        self.submitted = time.time()
+        self.seconds = None  # type: Optional[float]
+        self.future = None  # type: Optional[concurrent.futures.Future]
+        self.timer = None  # type: Optional[asyncio.TimerHandle]
+        self._changed = asyncio.Event()
+
+    def is_active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "status": self.status, "rows": self.rows, "cols": self.cols,
+                "num_known": self.num_known, "line_solves": self.line_solves, "seconds": self.seconds,
+                "grid": self.grid, "error": self.error}
+
+    # Sets the event next_change() returned, and starts a new one.
+    def notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    # Returns an event that is set on the next change. Taking it before reading the job means
+    # no change is missed, and a slow reader only ever skips to the latest state.
+    def next_change(self) -> asyncio.Event:
+        return self._changed
+
+
+# The service itself. Jobs are solved in a pool of worker processes; at most max_jobs may be
+# queued or running at once, and none longer than max_timeout seconds, counted from when it's
+# submitted. Call start() from a running event loop, and close() when done.
+# Ex:
+# service = SolveService("out/service_cache", workers=4)
+# await service.start(port=0)  # any free port, see get_address()
+class SolveService(object):
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, workers: Optional[int] = None,
+                 max_jobs: int = DEFAULT_MAX_JOBS, max_timeout: float = DEFAULT_MAX_TIMEOUT):
+        if max_jobs < 1:
+            raise ValueError("max_jobs must be at least 1, got " + str(max_jobs))
+        self._cache = ResultCache(cache_dir)
+        self._workers = workers or os.cpu_count() or 1
+        self._max_jobs = max_jobs
+        self._max_timeout = max_timeout
+        self._jobs = {}  # type: Dict[str, _Job]  # jobs by id, while active or if final but not cached
+        self._tokens = itertools.count()
+        self._loop = None
+        self._server = None
+        self._executor = None
+        self._manager = None
+        self._progress = None
+        self._cancelled = None
+        self._stopping = set()  # tokens put in _cancelled, until their worker returns
+        self._progress_thread = None
+
+    # Starts the worker pool and listens on host and port, or on a Unix socket if unix_path is
+    # given. Port 0 picks a free port.
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: Optional[str] = None):
+        self._loop = asyncio.get_running_loop()
+        self._manager = multiprocessing.Manager()
+        self._progress = self._manager.Queue()
+        self._cancelled = self._manager.dict()  # tokens of running jobs that should stop
+        self._executor = concurrent.futures.ProcessPoolExecutor(self._workers)
+        self._progress_thread = threading.Thread(target=self._forward_progress, daemon=True)
+        self._progress_thread.start()
+        if unix_path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, unix_path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+
+    # Returns the (host, port) or Unix socket path the service listens on.
+    def get_address(self):
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    # Cancels every active job, then stops listening and shuts the worker pool down.
+    async def close(self):
+        for job in list(self._jobs.values()):
+            if job.is_active():
+                self._cancel(job, STATUS_CANCELLED)
+        self._server.close()
+        await self._loop.run_in_executor(None, self._executor.shutdown)
+        self._progress.put(None)
+        await self._loop.run_in_executor(None, self._progress_thread.join)
+        self._manager.shutdown()
+        await self._server.wait_closed()
+
+    # Queues the clues to be solved, unless the same clues are already active or cached, in
+    # which case that job is returned instead, deadline and all. timeout: seconds the job may take, at most
+    # max_timeout. Raises ValueError if the clues aren't valid, and ServiceBusy if max_jobs jobs
+    # are already active.
+    def submit(self, row_clues: Clues, col_clues: Clues, timeout: Optional[float] = None) -> dict:
+        row_clues = _parse_clues(row_clues, "row_clues")
+        col_clues = _parse_clues(col_clues, "col_clues")
+        if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                    or timeout <= 0):
+            raise ValueError("timeout must be a positive number of seconds")
+        job_id = puzzle_hash(row_clues, col_clues)
+        job = self._jobs.get(job_id)
+        if job is not None and job.is_active():
+            return job.to_dict()
+        cached = self._cache.get(job_id)
+        if cached is not None:
+            return cached
+        if sum(1 for job in self._jobs.values() if job.is_active()) >= self._max_jobs:
+            raise ServiceBusy("%d jobs are already active" % self._max_jobs)
+        timeout = self._max_timeout if timeout is None else min(timeout, self._max_timeout)
+        job = _Job(job_id, "%s:%d" % (job_id, next(self._tokens)), len(row_clues), len(col_clues))
+        self._jobs[job_id] = job
+        job.future = self._executor.submit(_solve_job, job.token, row_clues, col_clues, job.submitted + timeout,
+                                           self._progress, self._cancelled)
+        job.future.add_done_callback(lambda future: self._loop.call_soon_threadsafe(self._job_done, job, future))
+        job.timer = self._loop.call_later(timeout, self._expire, job)
+        return job.to_dict()
+
+    # Returns the job with the given id, or None if there's no such job.
+    def get_job(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job is not None else self._cache.get(job_id)
+
+    # Cancels the job if it's active. Returns the job, or None if there's no such job.
+    def cancel(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return self._cache.get(job_id)
+        if job.is_active():
+            self._cancel(job, STATUS_CANCELLED)
+        return job.to_dict()
+
+    # Yields the job with the given id now and each time it changes, until it's final. Changes
+    # made while the consumer is busy are merged, so only the latest state is yielded.
+    async def watch(self, job_id: str) -> AsyncIterator[dict]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            result = self._cache.get(job_id)
+            if result is not None:
+                yield result
+            return
+        while True:
+            changed = job.next_change()
+            state = job.to_dict()
+            yield state
+            if state["status"] not in ACTIVE_STATUSES:
+                return
+            await changed.wait()
+
+    def get_status(self) -> dict:
+        return {"workers": self._workers, "active_jobs": sum(1 for job in self._jobs.values() if job.is_active()),
+                "max_jobs": self._max_jobs}
+
+    # Stops a job: drops it from the pool's queue if it hasn't started, else asks its worker to
+    # stop, which happens at the worker's next progress report.
+    def _cancel(self, job: _Job, status: str):
+        if not job.future.cancel():
+            self._cancelled[job.token] = True
+            self._stopping.add(job.token)
+        self._finish(job, status)
+
+    # Called when the job's deadline passes. A running job times out in its worker.
+    def _expire(self, job: _Job):
+        if job.is_active() and job.future.cancel():
+            self._finish(job, STATUS_TIMEOUT)
+
+    def _job_done(self, job: _Job, future: concurrent.futures.Future):
+        if job.token in self._stopping:
+            self._stopping.remove(job.token)
+            del self._cancelled[job.token]
+        if not job.is_active():
+            return  # already cancelled or timed out
+        try:
+            status, job.grid, job.line_solves = future.result()
+        except Exception as e:
+            status = STATUS_ERROR
+            job.error = "%s: %s" % (type(e).__name__, e)
+        if status == STATUS_SOLVED:
+            job.num_known = job.rows * job.cols
+        self._finish(job, status)
+
+    def _finish(self, job: _Job, status: str):
+        job.status = status
+        job.seconds = time.time() - job.submitted
+        job.timer.cancel()
+        if status in CACHED_STATUSES:
+            self._cache.put(job.id, job.to_dict())
+            del self._jobs[job.id]
+        job.notify()
+
+    # Runs in a thread, handing progress reports from the workers to the event loop.
+    def _forward_progress(self):
+        while True:
+            report = self._progress.get()
+            if report is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_progress, *report)
+
+    def _on_progress(self, token: str, num_known: int):
+        job = self._jobs.get(token.partition(":")[0])
+        if job is not None and job.token == token and job.is_active():
+            job.status = STATUS_RUNNING
+            job.num_known = num_known
+            job.notify()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await _read_request(reader)
+            await self._route(method, path, body, writer)
+        except _HttpError as e:
+            _write_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        parts = path.split("?")[0].strip("/").split("/")
+        if parts == ["status"] and method == "GET":
+            _write_json(writer, 200, self.get_status())
+        elif parts == ["jobs"] and method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("the request must be a JSON object")
+                job = self.submit(request.get("row_clues"), request.get("col_clues"), request.get("timeout"))
+            except ValueError as e:
+                raise _HttpError(400, str(e))
+            except ServiceBusy as e:
+                raise _HttpError(503, str(e))
+            _write_json(writer, 202 if job["status"] in ACTIVE_STATUSES else 200, job)
+        elif len(parts) == 2 and parts[0] == "jobs" and method in ("GET", "DELETE"):
+            job = self.get_job(parts[1]) if method == "GET" else self.cancel(parts[1])
+            if job is None:
+                raise _HttpError(404, "no such job")
+            _write_json(writer, 200, job)
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events" and method == "GET":
+            if self.get_job(parts[1]) is None:
+                raise _HttpError(404, "no such job")
+            # no Content-Length: the stream ends when the connection is closed
+            writer.write(_response_head(200, "application/x-ndjson"))
+            async for state in self.watch(parts[1]):
+                writer.write(json.dumps(state).encode() + b"\n")
+                await writer.drain()
+        elif parts[0] in ("status", "jobs"):
+            raise _HttpError(405, "method not allowed")
+        else:
+            raise _HttpError(404, "not found")
+
+
+class _HttpError(Exception):
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Reads an HTTP request. Returns (method, path, body).
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    parts = (await reader.readline()).decode("latin-1").split()
+    if len(parts) != 3:
+        raise _HttpError(400, "bad request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, sep, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise _HttpError(400, "bad Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise _HttpError(413, "request body over %d bytes" % MAX_BODY_BYTES)
+    return parts[0], parts[1], await reader.readexactly(length)
+
+
+def _response_head(status: int, content_type: str, length: Optional[int] = None) -> bytes:
+    lines = ["HTTP/1.1 %d %s" % (status, http.HTTPStatus(status).phrase), "Content-Type: " + content_type,
+             "Connection: close"]
+    if length is not None:
+        lines.append("Content-Length: %d" % length)
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _write_json(writer: asyncio.StreamWriter, status: int, value: Any):
+    body = json.dumps(value).encode()
+    writer.write(_response_head(status, "application/json", len(body)) + body)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+# Blocking client for tools that want a solved grid without importing the solver. Raises
+# ServiceError if the service answers with an error.
+# Ex:
+# job = ServiceClient(port=8765).solve(row_clues, col_clues, timeout=30)
+# if job["status"] == "solved":
+#     print("\n".join(job["grid"]))
+class ServiceClient(object):
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: Optional[str] = None,
+                 timeout: Optional[float] = None):
+        self._host = host
+        self._port = port
+        self._unix_path = unix_path
+        self._timeout = timeout
+
+    def submit(self, row_clues: Clues, col_clues: Clues, timeout: Optional[float] = None) -> dict:
+        return self._request("POST", "/jobs", {"row_clues": row_clues, "col_clues": col_clues, "timeout": timeout})
+
+    def get_job(self, job_id: str) -> dict:
+        return self._request("GET", "/jobs/" + job_id)
+
+    def cancel(self, job_id: str) -> dict:
+        return self._request("DELETE", "/jobs/" + job_id)
+
+    def get_status(self) -> dict:
+        return self._request("GET", "/status")
+
+    # Yields the job each time it changes, until it's final.
+    def events(self, job_id: str) -> Iterator[dict]:
+        connection = self._connect()
+        try:
+            connection.request("GET", "/jobs/%s/events" % job_id)
+            response = connection.getresponse()
+            if response.status != 200:
+                self._raise(response)
+            for line in response:
+                yield json.loads(line)
+        finally:
+            connection.close()
+
+    # Submits the clues and waits for the job to be final. Returns the final job.
+    def solve(self, row_clues: Clues, col_clues: Clues, timeout: Optional[float] = None) -> dict:
+        job = self.submit(row_clues, col_clues, timeout)
+        if job["status"] in ACTIVE_STATUSES:
+            for job in self.events(job["id"]):
+                pass
+        return job
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._unix_path is not None:
+            return _UnixHTTPConnection(self._unix_path, self._timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        connection = self._connect()
+        try:
+            if body is None:
+                connection.request(method, path)
+            else:
+                connection.request(method, path, json.dumps(body), {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            if response.status >= 300:
+                self._raise(response)
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _raise(response: http.client.HTTPResponse):
+        try:
+            message = json.loads(response.read())["error"]
+        except (ValueError, KeyError, TypeError):
+            message = response.reason
+        raise ServiceError(response.status, message)
+
+
+async def _serve(args: argparse.Namespace):
+    service = SolveService(args.cache_dir, args.workers, args.max_jobs, args.max_timeout)
+    await service.start(args.host, args.port, args.unix)
+    print("Listening on %s" % (service.get_address(),), flush=True)
+    try:
+        await service.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve puzzle solving to local tools over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of host and port")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="directory solved puzzles are cached in")
+    parser.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_JOBS, help="most jobs queued or running at once")
+    parser.add_argument("--max-timeout", type=float, default=DEFAULT_MAX_TIMEOUT,
+                        help="most seconds a job may take, from when it's submitted")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
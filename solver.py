@@ -1,98 +1,546 @@
-import collections
-from typing import List
+import threading
+from typing import Callable, Generator, List, Optional, Tuple
 
-from action import Action
+from checkpoint import DEFAULT_INTERVAL, Checkpoint, write_checkpoint
+from instrumentation import Instrumentation
+from line_cache import LineCache
+from line_solver import overlap_masks, solve_line
+from propagator import LineScore, Propagator, score_max_overlap, score_newly_known
 from puzzle import Puzzle
-import datetime
+import time
 
-from square import Square
+from square import Square, State
+
+# Line solving engines for _update_line.
+# ENGINE_COMBIN: enumerate every combination of filled squares (exponential in line length).
+# ENGINE_DP: dynamic programming line solver in line_solver.py, O(line length * number of clues).
+ENGINE_COMBIN = "combin"
+ENGINE_DP = "dp"
+
+
+# Statuses of a SolveResult.
+STATUS_SOLVED = "solved"
+STATUS_STALLED = "stalled"  # line solving can't settle any more squares
+STATUS_CONTRADICTION = "contradiction"  # the clues have no solution
+STATUS_TIMEOUT = "timeout"  # the time or line solve budget ran out
+STATUS_CANCELLED = "cancelled"
+
+
+# Raised by Solver.solve() when its timeout runs out before the puzzle is solved.
+class SolveTimeout(Exception):
+    pass
+
+
+# Raised when a solve's CancellationToken is cancelled.
+class SolveCancelled(Exception):
+    pass
+
+
+# Lets another thread stop a solve. The solver checks it before each line solve, so a cancelled
+# solve stops within one line solve.
+class CancellationToken(object):
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+# Where a bounded solve got to, as returned by Solver.anytime_solve().
+# status: one of the STATUS_ constants
+# grid: each row as a string of State symbols, " " for squares still unknown
+# line_solves, skipped_solves and seconds: the work this solve did
+class SolveResult(object):
+
+    def __init__(self, status: str, grid: List[str], num_known: int, line_solves: int, skipped_solves: int,
+                 seconds: float):
+        self.status = status
+        self.grid = grid
+        self.num_known = num_known
+        num_squares = sum(len(row) for row in grid)
+        self.fraction_known = num_known / num_squares if num_squares > 0 else 1.0
+        self.line_solves = line_solves
+        self.skipped_solves = skipped_solves
+        self.seconds = seconds
+
+
+# Squares settled by one line solve, as yielded by Solver.stream_solve().
+# cells: (row, col, state) of each newly settled square, in order along the line
+class Deduction(object):
+
+    def __init__(self, line_num: int, is_row: bool, cells: List[Tuple[int, int, State]]):
+        self.line_num = line_num
+        self.is_row = is_row
+        self.cells = cells
+
+
+# Returns the mask of a line with each block placed at the given start.
+def _blocks_mask(clues: Tuple[int, ...], starts: List[int]) -> int:
+    mask = 0
+    for clue, start in zip(clues, starts):
+        mask |= ((1 << clue) - 1) << start
+    return mask
 
 
 class Solver(object):
 
-    def __init__(self, puzzle: Puzzle):
+    # cache: if given, line solutions of the DP engine are memoized in it. Pass the same cache
+    # (eg. line_cache.get_shared_cache()) to several Solvers to share solutions between them.
+    # incremental: with the DP engine, skip or defer re-solving a queued line while the squares
+    # settled since its last solve can't narrow the range of any of its blocks (see
+    # _can_skip_line()). Only whole solves are skipped: a line that is solved again runs the full
+    # DP, none of its earlier tables are reused.
+    # score: the order lines are solved in by priority (see propagator.py). None for
+    # score_newly_known with queue_solve, else score_max_overlap.
+    def __init__(self, puzzle: Puzzle, engine: str = ENGINE_DP, cache: Optional[LineCache] = None,
+                 incremental: bool = True, score: Optional[LineScore] = None):
+        if engine not in (ENGINE_COMBIN, ENGINE_DP):
+            raise ValueError("Unknown line solving engine: " + str(engine))
         self._puzzle = puzzle
-        self._actions = []
-        # still don't quite understand what the point of this is. Just l to r, t to b?
-        # using argument unpacking to get list from range. 
-        self._row_priority = [*range(puzzle.rows)]
-        self._col_priority = [*range(puzzle.cols)]
-
-    # Solve by checking rows and cols in alternating priority order
-    # if update_solve: will update priority order after each iteration
-    # if queue_solve: will add newest updated squares to top of queue
-    def priority_solve(self, update_solve: bool = False, queue_solve: bool = False):
-        start_time_us = datetime.datetime.now().microsecond
-        if not queue_solve:
-            self._prioritize()
-        i = 1
-        self._init_actions(update_solve)
+        self._engine = engine
+        self._cache = cache
+        self._score = score
+        self._propagator = None
+        self._deadline = None  # time.perf_counter() value after which solving is abandoned
+        self._line_solve_limit = None  # value of _num_line_solves at which solving is abandoned
+        self._token = None  # type: Optional[CancellationToken]
+        self._num_line_solves = 0
+        self._instrumentation = None
+        self._num_placements = 0  # candidate placements the last line solve examined
+        self._incremental = incremental and engine == ENGINE_DP
+        # (is_row, line_num) -> (blocks at their leftmost starts, blocks at their rightmost starts)
+        # as masks, from the line's last DP solve
+        self._line_bounds = {}
+        # (is_row, line_num) -> round, of the lines skipped since they were last solved
+        self._deferred = {}
+        self._num_skipped_solves = 0
+        self._num_deferred_solves = 0
+        self._update_solve = False  # how the propagator was last set up, for checkpoints
+        self._queue_solve = False
+        self._checkpoint_path = None  # type: Optional[str]
+        self._checkpoint_interval = DEFAULT_INTERVAL
+        self._next_checkpoint = 0.0  # time.perf_counter() value after which the next one is written
+        self._progress_hook = None  # type: Optional[Callable[[int], None]]
+        self._progress_interval = 0.0
+        self._next_progress = 0.0  # time.perf_counter() value after which the hook is next called
+
+    # Solves as far as line solving can, without printing anything. Returns True if solved.
+    # Raises SolveTimeout if more than timeout seconds pass first.
+    # update_solve and queue_solve: same as for priority_solve()
+    def solve(self, timeout: Optional[float] = None, update_solve: bool = False, queue_solve: bool = False) -> bool:
+        self._set_budget(timeout)
+        self._line_solve(update_solve, queue_solve)
+        return self._puzzle.is_solved()
+
+    # Same as solve(), but stops once timeout seconds pass, max_line_solves lines are solved or
+    # token is cancelled, whichever comes first, and returns where it got to instead of raising.
+    # The grid is left as far as it got, so calling again continues from there.
+    # Ex:
+    # result = Solver(puzzle).anytime_solve(timeout=1.0)
+    # if result.status == STATUS_TIMEOUT:
+    #     print("%.0f%% known" % (result.fraction_known * 100))
+    def anytime_solve(self, timeout: Optional[float] = None, max_line_solves: Optional[int] = None,
+                      token: Optional[CancellationToken] = None, update_solve: bool = False,
+                      queue_solve: bool = False) -> SolveResult:
+        return self._run_bounded(lambda: self._line_solve(update_solve, queue_solve), timeout, max_line_solves, token)
+
+    # Runs the overlap pass then propagation from every line. Returns False on a contradiction.
+    def _line_solve(self, update_solve: bool, queue_solve: bool) -> bool:
+        is_consistent = self._overlap_pass() is not None
+        self._start_propagator(update_solve, queue_solve)
+        return is_consistent and self._propagate()
+
+    # Runs solve, which returns False on a contradiction, within the given budget. Returns the
+    # result, with the status SolveTimeout or SolveCancelled stopped it with, if one did.
+    def _run_bounded(self, solve: Callable[[], bool], timeout: Optional[float], max_line_solves: Optional[int],
+                     token: Optional[CancellationToken]) -> SolveResult:
+        self._set_budget(timeout, max_line_solves, token)
+        start_ns = time.perf_counter_ns()
+        num_line_solves = self._num_line_solves
+        num_skipped_solves = self._num_skipped_solves
+        try:
+            if not solve():
+                status = STATUS_CONTRADICTION
+            else:
+                status = STATUS_SOLVED if self._puzzle.is_solved() else STATUS_STALLED
+        except SolveTimeout:
+            status = STATUS_TIMEOUT
+        except SolveCancelled:
+            status = STATUS_CANCELLED
+        finally:
+            self._set_budget(None)
+        return SolveResult(status, self._puzzle.get_grid_rows(), self._puzzle.get_num_known_squares(),
+                           self._num_line_solves - num_line_solves, self._num_skipped_solves - num_skipped_solves,
+                           (time.perf_counter_ns() - start_ns) / 1e9)
+
+    # Same as solve(), but yields a Deduction as soon as a line solve settles squares, so a
+    # consumer can update incrementally. Solving only advances when the next deduction is asked
+    # for, so a slow consumer holds the solver back rather than deductions piling up. The
+    # generator returns (in its StopIteration) False if the clues have no solution, else True.
+    def stream_solve(self, timeout: Optional[float] = None, update_solve: bool = False,
+                     queue_solve: bool = False) -> Generator[Deduction, None, bool]:
+        self._set_budget(timeout)
+        settled = self._overlap_pass()
+        if settled is None:
+            return False
+        for line_num, is_row, changed in settled:
+            yield self._deduction(line_num, is_row, changed)
+        self._start_propagator(update_solve, queue_solve)
         while not self._puzzle.is_solved():
-            current_action = self._actions.pop(0)
-            for i in range(current_action.get_num_indices()):
-                self._update_line(current_action.get_index(i), current_action.is_row(), queue_solve)
-                self._puzzle.console_print("i = " + str(i))
-                i += 1
-                if update_solve:
-                    self._prioritize()
-            if len(self._actions) == 0:
-                self._init_actions(update_solve)
-        end_time_us = datetime.datetime.now().microsecond
-        self._puzzle.print("i = " + str(i))
+            self._check_deadline()
+            solved = self._propagate_line()
+            if solved is None:
+                break
+            line_num, is_row, changed = solved
+            if changed is None:
+                return False
+            if changed:
+                yield self._deduction(line_num, is_row, changed)
+        return True
+
+    # Writes a checkpoint to path every interval seconds while lines are propagated, so the solve
+    # can be carried on with set_checkpoint() and resume() if the process dies. None to stop.
+    def set_checkpoint_file(self, path: Optional[str], interval: float = DEFAULT_INTERVAL):
+        self._checkpoint_path = path
+        self._checkpoint_interval = interval
+        self._next_checkpoint = time.perf_counter() + interval
+
+    # Calls hook with the number of known squares every interval seconds while solving, checked
+    # before each line solve. The hook may cancel the solve's CancellationToken, which stops it
+    # before the next line solve. None to stop.
+    def set_progress_hook(self, hook: Optional[Callable[[int], None]], interval: float):
+        self._progress_hook = hook
+        self._progress_interval = interval
+        self._next_progress = 0.0
+
+    # Returns the state of the solve: the grid, the queued lines and the counters.
+    def get_checkpoint(self) -> Checkpoint:
+        queue = self._propagator.get_state() if self._propagator is not None else ([], 0, 0)
+        deferred = [(line_num, is_row, round_num) for (is_row, line_num), round_num in self._deferred.items()]
+        stats = {"line_solves": self._num_line_solves, "skipped_solves": self._num_skipped_solves,
+                 "deferred_solves": self._num_deferred_solves}
+        return Checkpoint(self._get_all_clues(True), self._get_all_clues(False), self._engine, self._update_solve,
+                          self._queue_solve, self._puzzle.snapshot(), queue, deferred, stats, None)
+
+    # Puts the puzzle and solver in the state of a checkpoint of the same clues, so resume()
+    # carries on from there. Raises ValueError if the checkpoint is of other clues.
+    def set_checkpoint(self, checkpoint: Checkpoint):
+        if checkpoint.row_clues != self._get_all_clues(True) or checkpoint.col_clues != self._get_all_clues(False):
+            raise ValueError("The checkpoint is of a puzzle with other clues")
+        self._puzzle.restore(checkpoint.grid)
+        self._start_propagator(checkpoint.update_solve, checkpoint.queue_solve)
+        self._propagator.set_state(checkpoint.queue)
+        self._deferred = {(is_row, line_num): round_num for line_num, is_row, round_num in checkpoint.deferred}
+        self._num_line_solves = checkpoint.stats["line_solves"]
+        self._num_skipped_solves = checkpoint.stats["skipped_solves"]
+        self._num_deferred_solves = checkpoint.stats["deferred_solves"]
+
+    # Carries on the solve set_checkpoint() restored. Returns True if solved. Raises SolveTimeout
+    # if more than timeout seconds pass first, and ValueError if there's no solve to carry on.
+    def resume(self, timeout: Optional[float] = None) -> bool:
+        self._check_resumable()
+        self._set_budget(timeout)
+        self._propagate()
+        return self._puzzle.is_solved()
+
+    # Raises ValueError unless a checkpoint was set, or a solve started, to resume from.
+    def _check_resumable(self):
+        if self._propagator is None:
+            raise ValueError("No checkpoint to resume from")
+
+    def _get_all_clues(self, is_row: bool) -> List[List[int]]:
+        return [self._puzzle.get_clues(i, is_row) for i in range(self._puzzle.rows if is_row else self._puzzle.cols)]
+
+    # Writes a checkpoint if the interval has passed since the last one, and the solve is at a
+    # point it can be resumed from.
+    def _checkpoint_if_due(self):
+        if time.perf_counter() >= self._next_checkpoint and self._can_checkpoint():
+            write_checkpoint(self._checkpoint_path, self.get_checkpoint())
+            self._next_checkpoint = time.perf_counter() + self._checkpoint_interval
+
+    # Returns False while the grid holds squares a checkpoint can't account for.
+    def _can_checkpoint(self) -> bool:
+        return True
+
+    def _deduction(self, line_num: int, is_row: bool, changed: List[int]) -> Deduction:
+        cells = []
+        for i in changed:
+            r = line_num if is_row else i
+            c = i if is_row else line_num
+            cells.append((r, c, self._puzzle.get_state(r, c)))
+        return Deduction(line_num, is_row, cells)
+
+    # Same as slow_solve(), without printing anything. Returns True if solved.
+    # Raises SolveTimeout if more than timeout seconds pass first.
+    def sweep_solve(self, timeout: Optional[float] = None) -> bool:
+        self._set_budget(timeout)
+        self._sweep()
+        return self._puzzle.is_solved()
+
+    def get_num_line_solves(self) -> int:
+        return self._num_line_solves
+
+    # Number of queued line solves skipped because the line's block ranges couldn't narrow.
+    def get_num_skipped_solves(self) -> int:
+        return self._num_skipped_solves
+
+    # Number of skipped lines solved in full once the queue ran out. A skip only saves work when
+    # the line is skipped again, or settled by its crossing lines, before that.
+    def get_num_deferred_solves(self) -> int:
+        return self._num_deferred_solves
+
+    # Records where solving spends its time, in both the solver and the puzzle. None to stop.
+    def set_instrumentation(self, instrumentation: Optional[Instrumentation]):
+        self._instrumentation = instrumentation
+        self._puzzle.set_instrumentation(instrumentation)
+
+    # Solve by checking rows and cols in priority order. Only lines crossing newly settled
+    # squares are re-solved, until the puzzle is solved or no line can settle any more squares.
+    # if update_solve: will update a line's priority whenever one of its squares changes
+    # if queue_solve: will solve the lines with the most newly updated squares first, unless the
+    # Solver was given a score
+    # timeout, max_line_solves and token: stop early, same as for anytime_solve()
+    def priority_solve(self, update_solve: bool = False, queue_solve: bool = False, timeout: Optional[float] = None,
+                       max_line_solves: Optional[int] = None,
+                       token: Optional[CancellationToken] = None) -> SolveResult:
+        result = self.anytime_solve(timeout, max_line_solves, token, update_solve, queue_solve)
+        self._print_status(result)
+        self._puzzle.print("Line solves = %d, skipped vs sweep = %d"
+                           % (result.line_solves, self._propagator.get_num_skipped()))
+        self._puzzle.print("Skipped unchanged lines = %d, deferred solves = %d"
+                           % (self._num_skipped_solves, self._num_deferred_solves))
         self._puzzle.file_print(self._puzzle.__str__())
-        self._puzzle.print("Time = %.4f seconds" % ((end_time_us - start_time_us) / 1e12))
+        self._puzzle.print("Time = %.4f seconds" % result.seconds)
+        return result
 
     # Naive solving method that checks each row then column until puzzle is solved.
-    def slow_solve(self):
-        i = 1
-        while not self._puzzle.is_solved():
-            # for debugging
-            self._puzzle.console_print(self._puzzle.__str__())
-            r = 0
-            while not self._puzzle.is_solved() and r < self._puzzle.rows:
-                # self._puzzle.print("r = " + str(r))
-                self._update_line(r, True, False)
-                i += 1
-                r += 1
-            c = 0
-            while not self._puzzle.is_solved() and c < self._puzzle.cols:
-                # self._puzzle.print("c = " + str(c))
-                self._update_line(c, False, False)
-                i += 1
-                c += 1
-        self._puzzle.print("i = " + str(i))
+    # Stops early if a whole pass settles no squares (stalled) or a line has no solution.
+    # timeout, max_line_solves and token: stop early, same as for anytime_solve()
+    def slow_solve(self, timeout: Optional[float] = None, max_line_solves: Optional[int] = None,
+                   token: Optional[CancellationToken] = None) -> SolveResult:
+        # for debugging
+        result = self._run_bounded(lambda: self._sweep(lambda: self._puzzle.console_print(self._puzzle.__str__())),
+                                   timeout, max_line_solves, token)
+        self._print_status(result)
+        self._puzzle.print("i = " + str(result.line_solves + 1))
         self._puzzle.print(self._puzzle.__str__())
+        return result
+
+    def _print_status(self, result: SolveResult):
+        if result.status == STATUS_CONTRADICTION:
+            self._puzzle.print("Contradiction: the clues have no solution")
+        elif result.status == STATUS_STALLED:
+            self._puzzle.print("Stalled: line solving can't settle any more squares")
+        elif result.status == STATUS_TIMEOUT:
+            self._puzzle.print("Timeout: stopped with %.1f%% of squares known" % (result.fraction_known * 100))
+        elif result.status == STATUS_CANCELLED:
+            self._puzzle.print("Cancelled: stopped with %.1f%% of squares known" % (result.fraction_known * 100))
+
+    # Solves every row then every col until the puzzle is solved or a whole pass settles no
+    # squares. Calls on_pass (if given) before each pass. Returns False on a contradiction.
+    def _sweep(self, on_pass: Optional[Callable[[], None]] = None) -> bool:
+        is_stalled = False
+        while not self._puzzle.is_solved() and not is_stalled:
+            if on_pass is not None:
+                on_pass()
+            is_stalled = True
+            for is_row in (True, False):
+                line_num = 0
+                while not self._puzzle.is_solved() and line_num < (self._puzzle.rows if is_row else self._puzzle.cols):
+                    self._check_deadline()
+                    changed = self._update_line(line_num, is_row)
+                    if changed is None:
+                        return False
+                    is_stalled = is_stalled and not changed
+                    line_num += 1
+        return True
+
+    # First stage of solving: settles every square the simple boxes and simple spaces rules decide
+    # from the clues alone (see line_solver.overlap_masks()), in one linear pass over the lines,
+    # so the line solver starts from a partly filled grid. Returns (line_num, is_row, indices of
+    # the newly settled squares) for each line that settled squares, or None if the clues don't
+    # fit a line or contradict squares already settled.
+    def _overlap_pass(self) -> Optional[List[Tuple[int, bool, List[int]]]]:
+        settled = []
+        for is_row in (True, False):
+            length = self._puzzle.cols if is_row else self._puzzle.rows
+            for line_num in range(self._puzzle.rows if is_row else self._puzzle.cols):
+                masks = overlap_masks(self._puzzle.get_line_info(line_num, is_row).clues, length)
+                if masks is None:
+                    return None
+                known, filled = self._puzzle.get_line_masks(line_num, is_row)
+                if masks[0] & known & (masks[1] ^ filled):
+                    return None
+                new_known = masks[0] & ~known
+                if not new_known:
+                    continue
+                changed = []
+                for i in range(length):
+                    if new_known >> i & 1:
+                        r = line_num if is_row else i
+                        c = i if is_row else line_num
+                        if masks[1] >> i & 1:
+                            self._puzzle.set_filled(r, c)
+                        else:
+                            self._puzzle.set_blank(r, c)
+                        changed.append(i)
+                settled.append((line_num, is_row, changed))
+        return settled
+
+    def _start_propagator(self, update_solve: bool, queue_solve: bool):
+        score = self._score or (score_newly_known if queue_solve else score_max_overlap)
+        self._update_solve = update_solve
+        self._queue_solve = queue_solve
+        self._propagator = Propagator(self._puzzle, score, update_solve)
+        self._propagator.push_all()
+        self._forget_line_states()
+
+    # Drops what was kept about the lines between solves, eg. when the grid is restored to an
+    # earlier state that the kept block ranges may not hold for.
+    def _forget_line_states(self):
+        self._line_bounds.clear()
+        self._deferred.clear()
+
+    # Sets what may stop the next solve: timeout seconds from now, max_line_solves more line
+    # solves, or token being cancelled. None for no limit.
+    def _set_budget(self, timeout: Optional[float], max_line_solves: Optional[int] = None,
+                    token: Optional[CancellationToken] = None):
+        self._deadline = None if timeout is None else time.perf_counter() + timeout
+        self._line_solve_limit = None if max_line_solves is None else self._num_line_solves + max_line_solves
+        self._token = token
+
+    # Called before each line solve. Calls the progress hook if it's due, then raises SolveTimeout
+    # once the time or line solve budget is spent, and SolveCancelled once the token is cancelled.
+    def _check_deadline(self):
+        if self._progress_hook is not None and time.perf_counter() >= self._next_progress:
+            self._next_progress = time.perf_counter() + self._progress_interval
+            self._progress_hook(self._puzzle.get_num_known_squares())
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise SolveTimeout()
+        if self._line_solve_limit is not None and self._num_line_solves >= self._line_solve_limit:
+            raise SolveTimeout()
+        if self._token is not None and self._token.is_cancelled():
+            raise SolveCancelled()
+
+    # Solves lines from the propagator until the puzzle is solved or no queued line is left.
+    # Returns False if some line has no arrangement matching its squares (a contradiction),
+    # in which case the rest of the queue is dropped.
+    def _propagate(self) -> bool:
+        while not self._puzzle.is_solved():
+            self._check_deadline()
+            if self._checkpoint_path is not None:
+                self._checkpoint_if_due()
+            solved = self._propagate_line()
+            if solved is None:
+                break
+            if solved[2] is None:
+                return False
+        return True
 
-    # Initialize action queue with alternating rows and cols in descending order
-    def _init_actions(self, use_priority: bool = False):
-        for i in range(max(self._puzzle.rows, self._puzzle.cols)):
-            if self._puzzle.is_valid_row(i):
-                self._actions.append(Action(True, [self._row_priority[-2][0]] if use_priority else i))
-            if self._puzzle.is_valid_col(i):
-                self._actions.append(Action(False, [self._col_priority[-2][0]] if use_priority else i))
-
-    def _prioritize(self):
-        self._prioritize_line(True)
-        self._prioritize_line(False)
-
-    # Sort the line by most inital overlap. Used for priority solver
-    def _prioritize_line(self, is_row: bool):
-        line_priority = self._row_priority if is_row else self._col_priority
-        for i in range(len(line_priority)):
-            line_priority[i][0] = i
-            line_priority[i][1] = self._max_overlap(i, is_row)
-        sorted(line_priority, key=lambda x: x[1], reverse=True)
-
-    # Returns the maximum initial overlap of the largest chunk in a line if it begins blank.
-    # Used to prioritize lines for the priority solver.
-    def _max_overlap(self, line_num: int, is_row: bool) -> int:
-        return self._puzzle.max_clue_val_in_line(line_num, is_row) \
-            - self._puzzle.get_num_unknown_squares_in_line(line_num, is_row) \
-            + self._puzzle.sum_clues_in_line(line_num, is_row) \
-            + len(self._puzzle.get_clues(line_num, is_row)) \
-            - 1
-
-    def _update_line(self, line_num: int, is_row: bool, update_actions: bool):
+    # Pops the next line from the propagator and solves it, queueing the lines crossing the
+    # squares it settles. Lines that _can_skip_line() are deferred instead, and once the
+    # propagator runs out, the deferred lines are solved in full so none is left unchecked.
+    # Returns (line_num, is_row, indices of the newly settled squares) for the line solved, with
+    # None as the indices on a contradiction, or None if no line is left to solve.
+    def _propagate_line(self) -> Optional[Tuple[int, bool, Optional[List[int]]]]:
+        while True:
+            if not self._propagator.is_empty():
+                line_num, is_row, round_num = self._propagator.pop()
+                if self._can_skip_line(line_num, is_row):
+                    self._deferred[(is_row, line_num)] = round_num
+                    self._num_skipped_solves += 1
+                    if self._instrumentation is not None:
+                        self._instrumentation.line_skipped(line_num, is_row)
+                    continue
+                self._deferred.pop((is_row, line_num), None)
+            elif self._deferred:
+                (is_row, line_num), round_num = self._deferred.popitem()
+                self._num_deferred_solves += 1
+            else:
+                return None
+            self._propagator.line_solved(round_num)
+            changed = self._update_line(line_num, is_row)
+            if changed is None:
+                self._propagator.clear()
+                self._deferred.clear()
+            else:
+                self._propagator.line_changed(is_row, changed, round_num)
+            return line_num, is_row, changed
+
+    # Returns True if the squares settled since the line's last DP solve can't narrow the range of
+    # starts of any of its blocks. The leftmost starts found by that solve form an arrangement of
+    # the line, and so do the rightmost; while both still agree with every settled square they
+    # are still the extremes, so the ranges are unchanged. Squares inside the ranges can still
+    # become settled, which is why skipped lines are solved in full before propagation stops.
+    def _can_skip_line(self, line_num: int, is_row: bool) -> bool:
+        if not self._incremental:
+            return False
+        bounds = self._line_bounds.get((is_row, line_num))
+        if bounds is None:
+            return False
+        known, filled = self._puzzle.get_line_masks(line_num, is_row)
+        return (bounds[0] ^ filled) & known == 0 and (bounds[1] ^ filled) & known == 0
+
+    # Solves the line and returns the indices of the squares in it that were newly settled,
+    # or None if no arrangement of the line's clues matches its squares.
+    def _update_line(self, line_num: int, is_row: bool) -> Optional[List[int]]:
+        self._num_line_solves += 1
+        instrumentation = self._instrumentation
+        if instrumentation is not None:
+            start_ns = time.perf_counter_ns()
+            self._num_placements = 0
+        known = self._puzzle.get_line_masks(line_num, is_row)[0]
+        if self._engine == ENGINE_DP:
+            is_consistent = self._update_line_dp(line_num, is_row)
+        else:
+            is_consistent = self._update_line_combin(line_num, is_row)
+        changed = None
+        if is_consistent:
+            new_known = self._puzzle.get_line_masks(line_num, is_row)[0] & ~known
+            changed = [i for i in range(self._puzzle.cols if is_row else self._puzzle.rows) if new_known >> i & 1]
+        if instrumentation is not None:
+            instrumentation.line_solved(line_num, is_row, self._num_placements, len(changed or []),
+                                        time.perf_counter_ns() - start_ns)
+        return changed
+
+    # Settles every square that is the same in all arrangements of the line, using the
+    # dynamic programming line solver. Returns False if the line has no solution.
+    def _update_line_dp(self, line_num: int, is_row: bool) -> bool:
+        if not self._puzzle.is_line_correct(line_num, is_row):
+            length = self._puzzle.cols if is_row else self._puzzle.rows
+            known, filled = self._puzzle.get_line_masks(line_num, is_row)
+            clues = self._puzzle.get_line_info(line_num, is_row).clues
+            if self._instrumentation is not None:
+                # the DP examines every start of every block
+                self._num_placements = sum(max(0, length - clue + 1) for clue in clues)
+            if self._cache is not None:
+                solution = self._cache.solve(clues, length, known, filled)
+            else:
+                solution = solve_line(clues, length, known, filled)
+            if solution is None:
+                return False
+            if self._incremental:
+                # only kept for _can_skip_line(), the next solve of the line starts from scratch
+                self._line_bounds[(is_row, line_num)] = (_blocks_mask(clues, solution.get_leftmost()),
+                                                         _blocks_mask(clues, solution.get_rightmost()))
+            new_known = solution.get_known() & ~known
+            for i in range(length):
+                if new_known >> i & 1:
+                    first = line_num if is_row else i
+                    second = i if is_row else line_num
+                    if solution.get_filled() >> i & 1:
+                        self._puzzle.set_filled(first, second)
+                    else:
+                        self._puzzle.set_blank(first, second)
+        return True
+
+    # Settles every square that is the same in all arrangements of the line, by enumerating
+    # every combination of filled squares. Returns False if the line has no solution.
+    def _update_line_combin(self, line_num: int, is_row: bool) -> bool:
         if not self._puzzle.is_line_correct(line_num, is_row):
             unknown_squares = []  # List of indices of unknown squares in line
             for i in range(self._puzzle.cols if is_row else self._puzzle.rows):
@@ -100,7 +548,10 @@ class Solver(object):
                     unknown_squares.append(i)
             k = self._puzzle.sum_clues_in_line(line_num, is_row) \
                 - self._puzzle.num_filled_squares_in_line(line_num, is_row)  # number of squares to fill
+            if not 0 <= k <= len(unknown_squares):
+                return False
             filled_square_guess = self._combin(k, unknown_squares)  # sets of all indices that could be filled
+            self._num_placements = len(filled_square_guess)
             line_guesses = []  # all possible lines as lists of Squares. All possible, not all valid
             # Populate all possible lines as Square lists
             for i in range(len(filled_square_guess)):  # iterate through every line combination
@@ -112,30 +563,24 @@ class Solver(object):
                 for j in range(len(new_guess)):
                     if new_guess[j].is_unknown():
                         new_guess[j].set_blank()
-                if collections.Counter(self._puzzle.get_clues(line_num, is_row)) \
-                        == collections.Counter(self._puzzle.generate_clues_for_line(new_guess)):
+                if self._puzzle.get_line_info(line_num, is_row).clues \
+                        == tuple(self._puzzle.generate_clues_for_line(new_guess)):
                     # if valid guess, add to list
                     line_guesses.append(new_guess)
             # If square is same across all possible valid lines, update grid
-            if len(line_guesses) > 0:
-                new_action = Action(is_row)
-                for i in range(len(line_guesses[0])):
-                    is_square_same = self._square_same_across_guesses(i, line_guesses)
-                    if is_square_same:
-                        is_filled = line_guesses[0][i].is_filled()
-                        first = line_num if is_row else i
-                        second = i if is_row else line_num
-                        if is_filled:
-                            self._puzzle.set_filled(first, second)
-                        else:
-                            self._puzzle.set_blank(first, second)
-                        # try:
-                        #     unknown_squares.index(i)
-                        #     new_action.add_index(i)
-                        # except ValueError:
-                        #     pass
-                if new_action.get_num_indices() > 0 and update_actions:
-                    self._actions.insert(0, new_action)
+            if len(line_guesses) == 0:
+                return False
+            for i in range(len(line_guesses[0])):
+                is_square_same = self._square_same_across_guesses(i, line_guesses)
+                if is_square_same:
+                    is_filled = line_guesses[0][i].is_filled()
+                    first = line_num if is_row else i
+                    second = i if is_row else line_num
+                    if is_filled:
+                        self._puzzle.set_filled(first, second)
+                    else:
+                        self._puzzle.set_blank(first, second)
+        return True
 
     # Returns list of sets of k elements from data, given that data is sorted ascending
     def _combin(self, k: int, data: List[int]) -> List[List[int]]:
@@ -182,4 +627,44 @@ class Solver(object):
         return squares_same
 
     def __str__(self) -> str:
-        return self._puzzle.__str__()
\ No newline at end of file
+        return self._puzzle.__str__()
+
+
+# Base for solvers that solve whole rounds of lines at a time, eg. every dirty row at once,
+# instead of one line at a time like Solver. It only has solve() and the counters callers such
+# as the benchmark read, which Solver has too. Subclasses implement _solve_rounds(), which
+# calls _check_deadline() before each round and returns once no round can settle more squares.
+class RoundSolver(object):
+
+    def __init__(self, puzzle: Puzzle):
+        self._puzzle = puzzle
+        self._deadline = None  # time.perf_counter() value after which solving is abandoned
+        self._num_line_solves = 0
+        self._num_rounds = 0
+
+    # Solves as far as line solving can. Returns True if solved. Raises SolveTimeout if more
+    # than timeout seconds pass first.
+    def solve(self, timeout: Optional[float] = None) -> bool:
+        self._deadline = None if timeout is None else time.perf_counter() + timeout
+        try:
+            self._solve_rounds()
+        finally:
+            self._deadline = None
+        return self._puzzle.is_solved()
+
+    def _check_deadline(self):
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise SolveTimeout()
+
+    def get_num_line_solves(self) -> int:
+        return self._num_line_solves
+
+    # Always 0: every line of a round is solved.
+    def get_num_skipped_solves(self) -> int:
+        return 0
+
+    def get_num_rounds(self) -> int:
+        return self._num_rounds
+
+    def __str__(self) -> str:
+        return self._puzzle.__str__()
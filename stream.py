@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Optional
+
+from solver import Deduction, Solver
+
+DEFAULT_MAX_PENDING = 64
+
+
+# Async version of Solver.stream_solve(). Solving runs in a worker thread so the event loop stays
+# responsive, and at most max_pending deductions are queued for the consumer: once that many
+# are waiting, the solver pauses until the consumer catches up. Leaving the loop early stops
+# the solver. After iterating, is_consistent is False if the clues turned out to have no
+# solution. Exceptions from the solver (eg. SolveTimeout) are raised to the consumer.
+# Ex:
+# async for deduction in AsyncSolveStream(Solver(puzzle)):
+#     for r, c, state in deduction.cells:
+#         ...
+class AsyncSolveStream(object):
+
+    def __init__(self, solver: Solver, timeout: Optional[float] = None, update_solve: bool = False,
+                 queue_solve: bool = False, max_pending: int = DEFAULT_MAX_PENDING):
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1, got " + str(max_pending))
+        self._solver = solver
+        self._timeout = timeout
+        self._update_solve = update_solve
+        self._queue_solve = queue_solve
+        self._max_pending = max_pending
+        self.is_consistent = None  # type: Optional[bool]
+
+    def __aiter__(self) -> AsyncIterator[Deduction]:
+        return self._run()
+
+    async def _run(self) -> AsyncIterator[Deduction]:
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        slots = threading.Semaphore(self._max_pending)
+        stop = threading.Event()
+
+        # Runs in the worker thread. Puts each deduction on the queue once a slot is free, then
+        # None when done. Returns what stream_solve() returned, or None if stopped.
+        def produce() -> Optional[bool]:
+            steps = self._solver.stream_solve(self._timeout, self._update_solve, self._queue_solve)
+            try:
+                while True:
+                    try:
+                        deduction = next(steps)
+                    except StopIteration as e:
+                        return e.value
+                    while not slots.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return None
+                    if stop.is_set():
+                        return None
+                    loop.call_soon_threadsafe(queue.put_nowait, deduction)
+            finally:
+                if not stop.is_set():
+                    loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        future = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                deduction = await queue.get()
+                if deduction is None:
+                    break
+                slots.release()
+                yield deduction
+            self.is_consistent = await future
+        finally:
+            stop.set()
+            await asyncio.wait([future])
@@ -0,0 +1,32 @@
+import pytest
+
+from puzzle import OUT_DIR, Puzzle
+from search import SearchSolver
+from solver import STATUS_CONTRADICTION
+
+
+# A 1x1 grid whose row needs 5 filled squares, which the col can't agree with
+def contradictory_puzzle() -> Puzzle:
+    return Puzzle.from_clues("contradiction", [[5]], [[1]])
+
+
+@pytest.fixture(autouse=True)
+def out_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # printing writes out/<name>.txt under the working directory
+    (tmp_path / OUT_DIR).mkdir()
+
+
+def test_solve_contradiction():
+    assert not SearchSolver(contradictory_puzzle()).solve()
+
+
+def test_anytime_solve_contradiction():
+    result = SearchSolver(contradictory_puzzle()).anytime_solve()
+    assert result.status == STATUS_CONTRADICTION
+
+
+def test_priority_solve_contradiction():
+    puzzle = contradictory_puzzle()
+    with puzzle:
+        result = SearchSolver(puzzle).priority_solve()
+    assert result.status == STATUS_CONTRADICTION
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from generate import clues_for_grid, random_grid
+from puzzle import Puzzle
+from service import ServiceClient, SolveService
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+WAIT_SECONDS = 60.0
+
+
+# Runs a SolveService with one worker on a free localhost port, in an event loop on its own
+# thread, and yields a client for it.
+@pytest.fixture
+def client(tmp_path):
+    loop = asyncio.new_event_loop()
+    service = SolveService(cache_dir=str(tmp_path), workers=1)
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(service.start(port=0), loop).result(WAIT_SECONDS)
+    host, port = service.get_address()[:2]
+    yield ServiceClient(host, port)
+    asyncio.run_coroutine_threadsafe(service.close(), loop).result(WAIT_SECONDS)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(WAIT_SECONDS)
+    loop.close()
+
+
+# Polls the job until its status is one of statuses, and returns it.
+def wait_for(client: ServiceClient, job_id: str, *statuses: str) -> dict:
+    deadline = time.perf_counter() + WAIT_SECONDS
+    while True:
+        job = client.get_job(job_id)
+        if job["status"] in statuses:
+            return job
+        assert time.perf_counter() < deadline, "job stuck at " + job["status"]
+        time.sleep(0.05)
+
+
+def test_solves_lib_puzzle(client):
+    row_path, col_path = Puzzle.clue_paths(LIB_DIR, "50by50")
+    row_clues = Puzzle.read_clues_file(row_path)
+    col_clues = Puzzle.read_clues_file(col_path)
+    job = wait_for(client, client.submit(row_clues, col_clues)["id"], "solved")
+    assert len(job["grid"]) == len(row_clues)
+    assert all(len(row) == len(col_clues) for row in job["grid"])
+    assert job["num_known"] == len(row_clues) * len(col_clues)
+    assert client.submit(row_clues, col_clues)["status"] == "solved"  # from the cache
+
+
+def test_cancel_frees_worker(client):
+    # a dense random grid line solving barely dents, so the search runs until cancelled
+    row_clues, col_clues = clues_for_grid(random_grid(60, 60, 0.5, 1), 60)
+    job_id = client.submit(row_clues, col_clues, timeout=WAIT_SECONDS)["id"]
+    wait_for(client, job_id, "running")
+    assert client.cancel(job_id)["status"] == "cancelled"
+    assert client.get_job(job_id)["status"] == "cancelled"
+    # the only worker must have stopped for the next job to run
+    row_clues, col_clues = clues_for_grid(random_grid(5, 5, 0.5, 2), 5)
+    assert wait_for(client, client.submit(row_clues, col_clues)["id"], "solved", "contradiction")["status"] == "solved"
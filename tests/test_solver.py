@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from puzzle import Puzzle
+from search import SearchSolver
+from solver import STATUS_TIMEOUT, Solver
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+
+
+def lib_puzzle(name: str) -> Puzzle:
+    row_path, col_path = Puzzle.clue_paths(LIB_DIR, name)
+    return Puzzle(name, row_path, col_path)
+
+
+@pytest.mark.parametrize("solver_class", [Solver, SearchSolver])
+def test_resume_without_checkpoint(solver_class):
+    with pytest.raises(ValueError, match="No checkpoint to resume from"):
+        solver_class(lib_puzzle("10by10")).resume()
+
+
+@pytest.mark.parametrize("solver_class", [Solver, SearchSolver])
+def test_resume_from_checkpoint(solver_class):
+    first = solver_class(lib_puzzle("10by10"))
+    assert first.anytime_solve(max_line_solves=5).status == STATUS_TIMEOUT
+    checkpoint = first.get_checkpoint()
+    puzzle = lib_puzzle("10by10")
+    second = solver_class(puzzle)
+    second.set_checkpoint(checkpoint)
+    assert second.resume()
+    assert puzzle.is_solved()